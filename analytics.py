@@ -0,0 +1,130 @@
+# coding=utf-8
+"""
+Estimated hours analytics, daily summary rows are loaded into NumPy arrays once
+and grouped per developer, project and week with vectorised bincounts
+"""
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+from sqlalchemy import func
+
+from models import DailyTaskSummary, Projects, Users, db
+
+WORKDAY_SECONDS = 8 * 3600
+# project id used for tasks without project, ids of tables start from 1
+NO_PROJECT = 0
+
+TaskArrays = namedtuple('TaskArrays', 'developer project day seconds tasks')
+
+
+def load(start, end):
+    """
+    Loads daily summary of given days into arrays
+    :param start: first day, datetime.date
+    :param end: last day, datetime.date
+    :return: TaskArrays, days are date ordinals
+    """
+    rows = db.session.query(DailyTaskSummary.tm_developer,
+                            func.coalesce(DailyTaskSummary.tm_task_project_id, NO_PROJECT),
+                            DailyTaskSummary.tm_added_on, DailyTaskSummary.tm_estimated_seconds,
+                            DailyTaskSummary.tm_task_count).filter(
+        DailyTaskSummary.tm_added_on >= start, DailyTaskSummary.tm_added_on <= end,
+        DailyTaskSummary.tm_developer != None).all()
+    if not rows:
+        return TaskArrays(*[np.zeros(0, np.int64) for _ in TaskArrays._fields])
+    developers, projects, days, seconds, tasks = zip(*rows)
+    return TaskArrays(np.array(developers, np.int64), np.array(projects, np.int64),
+                      np.fromiter((day.toordinal() for day in days), np.int64, len(days)),
+                      np.array(seconds, np.int64), np.array(tasks, np.int64))
+
+
+def group_sum(keys, *values):
+    """
+    Sums values per distinct key
+    :param keys: array of keys
+    :param values: arrays of same length as keys
+    :return: (distinct keys, sums of each values array)
+    """
+    distinct, index = np.unique(keys, return_inverse=True)
+    if not len(distinct):
+        return distinct, [np.zeros(0, np.int64) for _ in values]
+    return distinct, [np.bincount(index, weights=value, minlength=len(distinct)).astype(np.int64)
+                      for value in values]
+
+
+def week_start(days):
+    """
+    Returns ordinals of Mondays of weeks of given day ordinals, ordinal 1 is a Monday
+    """
+    return days - (days - 1) % 7
+
+
+def developer_totals(arrays):
+    """
+    Totals per developer, utilisation is estimated hours against an 8h day on each day developer added tasks
+    :return: (developers, seconds, tasks, days, utilisation)
+    """
+    developers, (seconds, tasks) = group_sum(arrays.developer, arrays.seconds, arrays.tasks)
+    # one key per (developer, day), developer ids and day ordinals both fit in 32 bits
+    developer_days = np.unique(arrays.developer << 32 | arrays.day) >> 32
+    _, (days,) = group_sum(developer_days, np.ones(len(developer_days), np.int64))
+    utilisation = seconds / (days * float(WORKDAY_SECONDS))
+    return developers, seconds, tasks, days, utilisation
+
+
+def project_totals(arrays):
+    """
+    Totals per project
+    :return: (projects, seconds, tasks)
+    """
+    projects, (seconds, tasks) = group_sum(arrays.project, arrays.seconds, arrays.tasks)
+    return projects, seconds, tasks
+
+
+def weekly_totals(arrays):
+    """
+    Totals per week
+    :return: (week start ordinals, seconds, tasks)
+    """
+    weeks, (seconds, tasks) = group_sum(week_start(arrays.day), arrays.seconds, arrays.tasks)
+    return weeks, seconds, tasks
+
+
+def _hours(seconds):
+    """
+    Returns seconds as hours rounded to 2 places
+    """
+    return round(seconds / 3600.0, 2)
+
+
+def report(start, end):
+    """
+    Estimated hours report of given days
+    :param start: first day, datetime.date
+    :param end: last day, datetime.date
+    :return: dict with developers, projects and weeks, each a list of dicts
+    """
+    arrays = load(start, end)
+
+    developers, seconds, tasks, days, utilisation = developer_totals(arrays)
+    names = dict(db.session.query(Users.id, Users.erp_user_name).filter(Users.id.in_(developers.tolist()))) \
+        if len(developers) else {}
+    developer_rows = [dict(id=developer, name=names.get(developer), hours=_hours(total), tasks=count,
+                           days=day_count, utilisation=round(value * 100, 1))
+                      for developer, total, count, day_count, value in zip(
+                          developers.tolist(), seconds.tolist(), tasks.tolist(), days.tolist(), utilisation.tolist())]
+
+    projects, seconds, tasks = project_totals(arrays)
+    names = dict(db.session.query(Projects.id, Projects.tm_project_name).filter(
+        Projects.id.in_(projects.tolist()))) if len(projects) else {}
+    project_rows = [dict(id=project if project != NO_PROJECT else None, name=names.get(project),
+                         hours=_hours(total), tasks=count)
+                    for project, total, count in zip(projects.tolist(), seconds.tolist(), tasks.tolist())]
+
+    weeks, seconds, tasks = weekly_totals(arrays)
+    week_rows = [dict(week=date.fromordinal(week).isoformat(), hours=_hours(total), tasks=count)
+                 for week, total, count in zip(weeks.tolist(), seconds.tolist(), tasks.tolist())]
+
+    return dict(start=start.isoformat(), end=end.isoformat(), developers=developer_rows, projects=project_rows,
+                weeks=week_rows)
@@ -0,0 +1,43 @@
+# coding=utf-8
+"""
+Logged in user and role of current request, resolved once per request
+"""
+from flask import g
+from flask_login import current_user
+
+ADMIN = 'admin'
+DEVELOPER = 'developer'
+
+
+def get_user():
+    """
+    Returns logged in user loaded by flask-login's user_loader, None for anonymous user
+    """
+    if 'tm_user' not in g:
+        g.tm_user = current_user._get_current_object() if current_user.get_id() else None
+    return g.tm_user
+
+
+def get_role():
+    """
+    Returns role of logged in user, None for anonymous user,
+    cached so it is not reloaded after a commit expires the user
+    """
+    if 'tm_user_role' not in g:
+        user = get_user()
+        g.tm_user_role = user.tm_user_role if user else None
+    return g.tm_user_role
+
+
+def is_admin():
+    """
+    Returns true if logged in user is admin
+    """
+    return get_role() == ADMIN
+
+
+def is_developer():
+    """
+    Returns true if logged in user is developer
+    """
+    return get_role() == DEVELOPER
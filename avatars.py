@@ -0,0 +1,155 @@
+# coding=utf-8
+"""
+Avatars of users, rendered on first request and stored by initials and colour,
+so users having same initials share one file
+"""
+import hashlib
+import os
+import tempfile
+from multiprocessing import Pool
+
+from PIL import Image, ImageDraw, ImageFont
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+dp_target = os.path.join(APP_ROOT, 'static/images/user_images/')
+font_target = os.path.join(APP_ROOT, 'static/fonts/DP_FONT.ttf')
+
+DEFAULT_COLOR = (255, 188, 22)
+
+# loaded fonts by size, loading TrueType font from disk costs more than drawing
+_fonts = {}
+
+
+def get_font(size=250):
+    """
+    Returns loaded DP font, None if font file is missing
+    :param size:
+    """
+    font = _fonts.get(size)
+    if font is None and os.path.isfile(font_target):
+        font = _fonts[size] = ImageFont.truetype(font_target, size)
+    return font
+
+
+def get_initials(username):
+    """
+    Returns initials of first and last name e.g. 'JD' for 'John Doe'
+    :param username:
+    """
+    names = username.split()
+    if len(names) > 1:
+        return names[0][0].upper() + names[1][0].upper()
+    elif names:
+        return " " + names[0][0].upper()
+    return " "
+
+
+def get_avatar_key(initials, color=DEFAULT_COLOR):
+    """
+    Returns content address of avatar
+    :param initials:
+    :param color: RGB tuple
+    """
+    return hashlib.sha1(initials.encode('utf-8') + '#%02x%02x%02x' % color).hexdigest()
+
+
+def render_avatar(initials, color=DEFAULT_COLOR):
+    """
+    Draws initials on transparent 460x460 image
+    :param initials:
+    :param color: RGB tuple
+    :return: PIL image
+    """
+    w, h = (460, 460)
+    im = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(im)
+
+    if ("MW" == initials) or ("WM" == initials):
+        w_h = ((w - 800 / 2) / 2, (h - 920 / 2) / 2)
+    elif any(i in initials for i in 'MW'):
+        w_h = ((w - 650 / 2) / 2, (h - 920 / 2) / 2)
+    else:
+        w_h = ((w - 516 / 2) / 2, (h - 920 / 2) / 2)
+
+    font = get_font()
+    if font:
+        draw.text(w_h, initials, fill=color, font=font)
+    else:
+        draw.text(w_h, initials, fill=color)
+    return im
+
+
+def get_avatar_path(initials, color=DEFAULT_COLOR):
+    """
+    Returns path where avatar of given initials and colour is stored
+    """
+    return os.path.join(dp_target, get_avatar_key(initials, color) + '.png')
+
+
+def save_avatar(initials, color=DEFAULT_COLOR):
+    """
+    Renders avatar and stores it at its content address
+    :return: path of avatar
+    """
+    path = get_avatar_path(initials, color)
+    if not os.path.exists(dp_target):
+        try:
+            os.makedirs(dp_target)
+        except OSError:
+            # created by a concurrent request
+            pass
+    # write to temporary file and rename it, so concurrent requests never serve half written PNG
+    fd, temp_path = tempfile.mkstemp(suffix='.png', dir=dp_target)
+    with os.fdopen(fd, 'wb') as temp_file:
+        render_avatar(initials, color).save(temp_file, "PNG")
+    os.rename(temp_path, path)
+    return path
+
+
+def get_avatar(username, color=DEFAULT_COLOR):
+    """
+    Returns path of avatar PNG of user, renders it if it does not exist yet
+    :param username:
+    :param color: RGB tuple
+    """
+    initials = get_initials(username)
+    path = get_avatar_path(initials, color)
+    if not os.path.exists(path):
+        path = save_avatar(initials, color)
+    return path
+
+
+def _save_avatar(args):
+    """
+    save_avatar for worker processes of pool
+    """
+    return save_avatar(*args)
+
+
+def rebuild_avatars(usernames, processes=None, force=False):
+    """
+    Renders avatars of users in a process pool, initials whose avatar already exists are skipped
+    :param usernames: names of users
+    :param processes: number of worker processes, defaults to number of CPUs
+    :param force: render existing avatars again
+    :return: (rendered, skipped)
+    """
+    pending = set()
+    skipped = 0
+    for username in usernames:
+        initials = get_initials(username)
+        if initials in pending or (not force and os.path.exists(get_avatar_path(initials))):
+            skipped += 1
+        else:
+            pending.add(initials)
+
+    if pending:
+        pool = Pool(processes)
+        try:
+            for _ in pool.imap_unordered(_save_avatar, [(initials, DEFAULT_COLOR) for initials in pending],
+                                         chunksize=16):
+                pass
+        finally:
+            pool.close()
+            pool.join()
+    return len(pending), skipped
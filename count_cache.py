@@ -0,0 +1,91 @@
+# coding=utf-8
+"""
+Short lived cache of list view counts, keyed by view and the SQL of its filtered count query
+"""
+import threading
+import time
+from functools import wraps
+
+from sqlalchemy.orm import Query
+
+_lock = threading.Lock()
+_counts = {}
+
+
+def get(key, ttl):
+    """
+    Returns cached count or None if it is missing or older than ttl seconds
+    """
+    with _lock:
+        entry = _counts.get(key)
+    if entry and time.time() - entry[1] < ttl:
+        return entry[0]
+    return None
+
+
+def put(key, count):
+    """
+    Caches count
+    """
+    with _lock:
+        _counts[key] = (count, time.time())
+
+
+def invalidate():
+    """
+    Drops all cached counts, called whenever a record is created, edited or deleted
+    """
+    with _lock:
+        _counts.clear()
+
+
+class CachedCountQuery(object):
+    """
+    Wraps count query of a view, Flask-Admin keeps applying search/filters to it and scalar() is served from cache
+    """
+
+    def __init__(self, query, view_key, ttl):
+        self.query = query
+        self.view_key = view_key
+        self.ttl = ttl
+
+    def __getattr__(self, name):
+        attr = getattr(self.query, name)
+        if not callable(attr):
+            return attr
+
+        @wraps(attr)
+        def wrapper(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if isinstance(result, Query):
+                return CachedCountQuery(result, self.view_key, self.ttl)
+            return result
+
+        return wrapper
+
+    def scalar(self):
+        """
+        Count from cache, counted and cached on miss
+        """
+        statement = self.query.statement.compile()
+        key = (self.view_key, str(statement), repr(sorted(statement.params.items())))
+        count = get(key, self.ttl)
+        if count is None:
+            count = self.query.scalar()
+            put(key, count)
+        return count
+
+
+def cached_count(get_count_query):
+    """
+    Decorator for get_count_query of model views, uses count_cache_ttl of view
+    """
+
+    @wraps(get_count_query)
+    def wrapper(view):
+        query = get_count_query(view)
+        if not view.count_cache_ttl:
+            return query
+        return CachedCountQuery(query, view.endpoint, view.count_cache_ttl)
+
+    return wrapper
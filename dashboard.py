@@ -0,0 +1,43 @@
+# coding=utf-8
+"""
+Set-based queries backing the Quick View of Task Manager
+"""
+from sqlalchemy.orm import joinedload
+
+from models import DailyTaskSummary, Tasks, Users, db
+
+DEVELOPER = 'developer'
+
+
+def get_attendance(date):
+    """
+    Splits active developers into present/absent for given date, read from daily summary
+    so it costs O(developers) instead of O(tasks)
+    :param date: datetime.date
+    :return: (present, absent), both are lists of Users ordered by name
+    """
+    present_ids = set(developer for developer, in db.session.query(DailyTaskSummary.tm_developer).filter(
+        DailyTaskSummary.tm_added_on == date, DailyTaskSummary.tm_task_count > 0))
+    present = []
+    absent = []
+    for user in Users.query.filter(Users.tm_user_role == DEVELOPER, Users.tm_user_status == True).order_by(
+            Users.erp_user_name.asc()):
+        if user.id in present_ids:
+            present.append(user)
+        else:
+            absent.append(user)
+    return present, absent
+
+
+def get_developer_tasks(developer, date):
+    """
+    Returns tasks of developer for given date with their projects loaded
+    :param developer: id of developer
+    :param date: datetime.date
+    :return: (submitted, pending)
+    """
+    tasks = Tasks.query.options(joinedload(Tasks.relative_project)).filter_by(
+        tm_developer=developer, tm_added_on=date).order_by(Tasks.id.asc()).all()
+    submitted = [task for task in tasks if task.erp_task_status]
+    pending = [task for task in tasks if not task.erp_task_status]
+    return submitted, pending
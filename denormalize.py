@@ -0,0 +1,104 @@
+# coding=utf-8
+"""
+Keeps columns and tables derived from Tasks in sync, all task hooks and CLI commands go through here
+"""
+from sqlalchemy import and_, func, or_
+
+from models import DailyTaskSummary, Tasks, Users, db
+
+# (date, developer) slices refreshed per statement
+SUMMARY_CHUNK_SIZE = 100
+
+
+def refresh_latest_task(developer_ids=None):
+    """
+    Sets latest task of developers to MAX(tm_added_on) of their tasks in one UPDATE,
+    uses (tm_developer, tm_added_on) index of tasks
+    :param developer_ids: ids of developers, None for all users
+    :return: number of updated users
+    """
+    latest_task = db.session.query(func.max(Tasks.tm_added_on)).filter(
+        Tasks.tm_developer == Users.id).correlate(Users).as_scalar()
+    query = Users.query
+    if developer_ids is not None:
+        query = query.filter(Users.id.in_(developer_ids))
+    return query.update({Users.tm_latest_task: latest_task}, synchronize_session=False)
+
+
+def _summarize(rows):
+    """
+    Aggregates task rows by (tm_added_on, tm_developer, tm_task_project_id)
+    :param rows: (tm_added_on, tm_developer, tm_task_project_id, tm_estimated_hours, erp_task_status)
+    :return: list of dicts of DailyTaskSummary columns
+    """
+    summary = {}
+    for added_on, developer, project, estimated_hours, submitted in rows:
+        entry = summary.get((added_on, developer, project))
+        if entry is None:
+            entry = summary[(added_on, developer, project)] = dict(
+                tm_added_on=added_on, tm_developer=developer, tm_task_project_id=project, tm_task_count=0,
+                tm_estimated_seconds=0, tm_submitted_count=0)
+        entry['tm_task_count'] += 1
+        if estimated_hours:
+            entry['tm_estimated_seconds'] += estimated_hours.hour * 3600 + estimated_hours.minute * 60 + \
+                                             estimated_hours.second
+        if submitted:
+            entry['tm_submitted_count'] += 1
+    return summary.values()
+
+
+_summary_columns = (Tasks.tm_added_on, Tasks.tm_developer, Tasks.tm_task_project_id, Tasks.tm_estimated_hours,
+                    Tasks.erp_task_status)
+
+
+def refresh_daily_summary(keys):
+    """
+    Recomputes daily summary of given days of developers from their tasks
+    :param keys: iterable of (tm_added_on, tm_developer)
+    :return: number of summary rows written
+    """
+    keys = list(set(key for key in keys if key[0] is not None))
+    count = 0
+    for i in xrange(0, len(keys), SUMMARY_CHUNK_SIZE):
+        chunk = keys[i:i + SUMMARY_CHUNK_SIZE]
+        DailyTaskSummary.query.filter(or_(*[
+            and_(DailyTaskSummary.tm_added_on == added_on, DailyTaskSummary.tm_developer == developer)
+            for added_on, developer in chunk])).delete(synchronize_session=False)
+        rows = _summarize(db.session.query(*_summary_columns).filter(or_(*[
+            and_(Tasks.tm_added_on == added_on, Tasks.tm_developer == developer) for added_on, developer in chunk])))
+        if rows:
+            db.session.bulk_insert_mappings(DailyTaskSummary, rows)
+        count += len(rows)
+    return count
+
+
+def rebuild_daily_summary(chunk_size=1000):
+    """
+    Recomputes whole daily summary, tasks are streamed in order of day
+    :param chunk_size: rows fetched and inserted at a time
+    :return: number of summary rows written
+    """
+    DailyTaskSummary.query.delete(synchronize_session=False)
+    query = db.session.query(*_summary_columns).order_by(Tasks.tm_added_on.asc()).yield_per(chunk_size)
+    count = 0
+    day = None
+    rows = []
+    for row in query:
+        if row[0] != day:
+            # all tasks of a day are summarised together, so a day never spans two inserts
+            if len(rows) >= chunk_size:
+                count += _insert_summary(rows)
+                rows = []
+            day = row[0]
+        rows.append(row)
+    return count + _insert_summary(rows)
+
+
+def _insert_summary(rows):
+    """
+    Inserts summary of task rows
+    """
+    summary = _summarize(rows)
+    if summary:
+        db.session.bulk_insert_mappings(DailyTaskSummary, summary)
+    return len(summary)
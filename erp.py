@@ -0,0 +1,174 @@
+# coding=utf-8
+"""
+Submits tasks of Task Manager to ERP
+"""
+import threading
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from metrics import timed
+
+
+def get_hour_minute(tm_estimated_hours):
+    """
+    Returns separated hours and minute from '08:00:00'
+    :param tm_estimated_hours: string or datetime.time
+    :return:
+    """
+    if not isinstance(tm_estimated_hours, basestring):
+        tm_estimated_hours = tm_estimated_hours.strftime('%H:%M:%S')
+    parts = tm_estimated_hours.split(':')
+    if len(parts) > 1 and parts[0] and parts[1]:
+        return parts[0], parts[1]
+    else:
+        # Estimated hours is not set properly, so default time is set to 08:00
+        return '08', '00'
+
+
+def get_task_details(task):
+    """
+    Returns form data of ERP's add task page for given task
+    :param task:
+    :return:
+    """
+    t_type = 1
+    t_priority = 1
+    t_status = 1
+    t_qa = None
+    if task.tm_type == 'Bug':
+        t_type = 0
+    if task.tm_priority == "Low":
+        t_priority = 0
+    if task.relative_qa:
+        t_qa = task.relative_qa.erp_user_id
+    hour, minute = get_hour_minute(task.tm_estimated_hours)
+    estimated_hour_key = 'Tasks[task_estimated_hours][' + \
+                         str((datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) -
+                              datetime(1970, 1, 1)).total_seconds()) + ']'
+    return {
+        'Tasks[task_title]': task.tm_task_title,
+        'Tasks[task_type]': t_type,
+        'Tasks[task_priority]': t_priority,
+        'Tasks[start_date]': '{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(task.tm_start_date),
+        'Tasks[end_date]': '{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(task.tm_end_date),
+        'hour': hour,
+        'minute': minute,
+        estimated_hour_key: hour + ':' + minute,
+        'Tasks[quality_assurer_id]': t_qa,
+        'Tasks[status]:': t_status,
+        'Tasks[delay_reason]': '',
+        'Tasks[project_id]': task.relative_project.erp_project_id,
+        'Tasks[milestone_id]': task.relative_milestone.erp_milestone_id,
+        'Tasks[developer_id]': task.relative_developer.erp_user_id,
+        'Tasks[task_description]': task.tm_description
+    }
+
+
+class ErpClient(object):
+    """
+    Logged in ERP session shared by a batch of tasks, tasks are submitted concurrently over pooled connections
+    """
+
+    def __init__(self, config, concurrency=4):
+        """
+        :param config: app config having ERP urls and credentials
+        :param concurrency: number of tasks submitted at a time
+        """
+        self.config = config
+        self.concurrency = concurrency
+        self.timeout = config.get('ERP_TIMEOUT', 30)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._login_lock = threading.Lock()
+        self._logins = 0
+
+    def __enter__(self):
+        self.login()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.logout()
+
+    @timed('erp_login')
+    def login(self):
+        """
+        Login to ERP using credentials of config
+        """
+        login_info = {
+            'LoginForm[username]': self.config['USERNAME'],
+            'LoginForm[password]': self.config['PASSWORD']
+        }
+        self.session.post(self.config['URL_ERP_LOGIN'], data=login_info, timeout=self.timeout).raise_for_status()
+        self._logins += 1
+
+    def logout(self):
+        """
+        Logout from ERP and release pooled connections
+        """
+        try:
+            self.session.get(self.config['URL_ERP_LOGOUT'], timeout=self.timeout)
+        except requests.RequestException:
+            # tasks are already submitted, failing to logout should not fail the batch
+            pass
+        finally:
+            self.session.close()
+
+    def _relogin(self, logins):
+        """
+        Login again unless another thread already did it after session expired
+        :param logins: number of logins seen by caller before session expired
+        """
+        with self._login_lock:
+            if self._logins == logins:
+                self.login()
+
+    @timed('erp_add_task')
+    def _post_task(self, task_details, project_id):
+        """
+        :return: False if ERP redirected to login page i.e. session is expired
+        """
+        response = self.session.post(self.config['URL_ADD_TASK'] + '/' + project_id, data=task_details,
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        return response.url != self.config['URL_ERP_LOGIN']
+
+    def add_task(self, task_details, project_id):
+        """
+        Submits task, logs in again once if session is expired
+        :param task_details: form data returned by get_task_details
+        :param project_id: ERP project id
+        :return: False if ERP still redirects to login page
+        """
+        logins = self._logins
+        if self._post_task(task_details, project_id):
+            return True
+        self._relogin(logins)
+        return self._post_task(task_details, project_id)
+
+    def _add_task(self, item):
+        key, task_details, project_id = item
+        try:
+            if self.add_task(task_details, project_id):
+                return key, None
+            return key, 'ERP redirected to login page, please check ERP credentials'
+        except Exception as ex:
+            return key, str(ex) or ex.__class__.__name__
+
+    def add_tasks(self, items):
+        """
+        Submits tasks concurrently
+        :param items: list of (key, task_details, project_id)
+        :return: dict of key and error, error is None for added tasks
+        """
+        if not items:
+            return {}
+        pool = ThreadPool(min(self.concurrency, len(items)))
+        try:
+            return dict(pool.map(self._add_task, items))
+        finally:
+            pool.close()
+            pool.join()
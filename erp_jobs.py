@@ -0,0 +1,195 @@
+# coding=utf-8
+"""
+Persistent queue of tasks waiting to be added to ERP, processed by a separate worker process
+To run worker,
+    FLASK_APP=main.py flask erp-worker
+"""
+import time
+from datetime import datetime
+
+import metrics
+from denormalize import refresh_daily_summary
+from erp import ErpClient, get_task_details
+from sqlalchemy import inspect
+from sqlalchemy.orm.exc import ObjectDeletedError
+
+from models import ErpJobs, Tasks, db
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+TASK_DELETED = 'Task deleted'
+
+
+def enqueue_tasks(ids):
+    """
+    Queues tasks which are neither submitted nor waiting in queue
+    :param ids: ids of tasks
+    :return: number of newly queued tasks
+    """
+    waiting = set(job.tm_task_id for job in ErpJobs.query.filter(
+        ErpJobs.tm_task_id.in_(ids), ErpJobs.tm_job_status.in_([QUEUED, RUNNING])))
+    count = 0
+    for task in Tasks.query.filter(Tasks.id.in_(ids), Tasks.erp_task_status == False):
+        if task.id not in waiting:
+            db.session.add(ErpJobs(relative_task=task, tm_job_status=QUEUED))
+            count += 1
+    db.session.commit()
+    return count
+
+
+def requeue_jobs(ids):
+    """
+    Puts failed jobs back in queue
+    :param ids: ids of jobs
+    :return: number of requeued jobs
+    """
+    count = ErpJobs.query.filter(ErpJobs.id.in_(ids), ErpJobs.tm_job_status == FAILED).update(
+        {'tm_job_status': QUEUED, 'tm_attempts': 0, 'tm_updated_on': datetime.now()}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def requeue_stale_jobs():
+    """
+    Puts jobs left running by a stopped worker back in queue
+    :return: number of requeued jobs
+    """
+    count = ErpJobs.query.filter_by(tm_job_status=RUNNING).update(
+        {'tm_job_status': QUEUED, 'tm_updated_on': datetime.now()}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def claim_next_job():
+    """
+    Marks oldest queued job as running, so no other worker picks it up
+    :return: claimed job or None if queue is empty
+    """
+    while True:
+        job = ErpJobs.query.filter_by(tm_job_status=QUEUED).order_by(ErpJobs.id.asc()).first()
+        if job is None:
+            return None
+        claimed = ErpJobs.query.filter_by(id=job.id, tm_job_status=QUEUED).update(
+            {'tm_job_status': RUNNING, 'tm_attempts': ErpJobs.tm_attempts + 1, 'tm_updated_on': datetime.now()},
+            synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return job
+
+
+def claim_jobs(limit):
+    """
+    Claims a batch of queued jobs
+    :param limit: maximum number of jobs
+    :return: list of claimed jobs
+    """
+    jobs = []
+    while len(jobs) < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        jobs.append(job)
+    return jobs
+
+
+def _task_of(job):
+    """
+    Returns task of job, None if task was deleted after job was claimed, job may be deleted along with it
+    """
+    try:
+        return job.relative_task
+    except ObjectDeletedError:
+        return None
+
+
+def process_jobs(jobs, client, max_attempts=3):
+    """
+    Submits tasks of jobs to ERP through one client and records the outcomes
+    :param jobs: claimed jobs
+    :param client: logged in ErpClient
+    :param max_attempts: job is marked failed after these many attempts
+    :return: number of tasks added to ERP
+    """
+    errors = {}
+    items = []
+    deleted = set()
+    for job in jobs:
+        task = _task_of(job)
+        if task is None:
+            # job row may be gone too, so it is updated with a query which matches nothing in that case
+            ErpJobs.query.filter_by(id=inspect(job).identity[0]).update(
+                {'tm_job_status': FAILED, 'tm_last_error': TASK_DELETED, 'tm_updated_on': datetime.now()},
+                synchronize_session=False)
+            deleted.add(job)
+            continue
+        if task.erp_task_status:
+            errors[job.id] = None
+            continue
+        try:
+            items.append((job.id, get_task_details(task), str(task.relative_project.erp_project_id)))
+        except Exception as ex:
+            errors[job.id] = str(ex)
+    errors.update(client.add_tasks(items))
+
+    count = 0
+    submitted = set()
+    for job in jobs:
+        if job in deleted:
+            continue
+        error = errors[job.id]
+        if error is None:
+            job.relative_task.erp_task_status = True
+            job.tm_job_status = DONE
+            job.tm_last_error = None
+            submitted.add((job.relative_task.tm_added_on, job.relative_task.tm_developer))
+            count += 1
+        else:
+            job.tm_job_status = QUEUED if job.tm_attempts < max_attempts else FAILED
+            job.tm_last_error = error
+    db.session.flush()
+    refresh_daily_summary(submitted)
+    db.session.commit()
+    return count
+
+
+def run_worker(config, poll_interval=2, max_attempts=3, batch_size=50, concurrency=4, burst=False,
+               metrics_file=None):
+    """
+    Processes queued jobs batch by batch until stopped, ERP login is done once per batch
+    :param config: app config having ERP urls and credentials
+    :param poll_interval: seconds to wait when queue is empty
+    :param max_attempts: attempts per job before it is marked failed
+    :param batch_size: jobs claimed at a time
+    :param concurrency: tasks submitted to ERP at a time
+    :param burst: stop once queue is empty
+    :param metrics_file: path where metrics are written after each batch
+    :return: number of tasks added to ERP
+    """
+    requeue_stale_jobs()
+    count = 0
+    while True:
+        jobs = claim_jobs(batch_size)
+        if not jobs:
+            if burst:
+                return count
+            time.sleep(poll_interval)
+            continue
+        try:
+            with ErpClient(config, concurrency=concurrency) as client:
+                count += process_jobs(jobs, client, max_attempts=max_attempts)
+        except Exception as ex:
+            # ERP is unreachable, put whole batch back
+            db.session.rollback()
+            for job in jobs:
+                job.tm_job_status = QUEUED if job.tm_attempts < max_attempts else FAILED
+                job.tm_last_error = str(ex)
+            db.session.commit()
+            if burst:
+                return count
+            time.sleep(poll_interval)
+        finally:
+            if metrics_file:
+                metrics.write(metrics_file)
@@ -0,0 +1,350 @@
+# coding=utf-8
+"""
+Syncs users, qas, projects and milestones pushed by ERP,
+a whole batch is validated with IN queries and written in one transaction
+"""
+from sqlalchemy import and_, bindparam, select
+from werkzeug.security import generate_password_hash
+
+from models import Milestones, Projects, Qa, Users, db, project_developer, project_qa
+
+DEVELOPER = 'developer'
+ROLES = ('admin', DEVELOPER)
+
+# SQLite allows 999 parameters per statement
+IN_CHUNK_SIZE = 500
+
+
+def _is_id(value):
+    """
+    Returns true if value is an ERP id, a positive integer
+    """
+    return isinstance(value, (int, long)) and not isinstance(value, bool) and value > 0
+
+
+def _is_text(value):
+    """
+    Returns true if value is a non blank string
+    """
+    return isinstance(value, basestring) and bool(value.strip())
+
+
+def _is_id_list(value):
+    """
+    Returns true if value is a list of ERP ids
+    """
+    return isinstance(value, list) and all(_is_id(item) for item in value)
+
+
+def _field_values(records, name, check=_is_id):
+    """
+    Returns values of field of records which pass check, records of wrong type are skipped
+    so lookups done before validation never fail
+    """
+    return [record[name] for record in records if isinstance(record, dict) and check(record.get(name))]
+
+
+def _chunks(values, size=IN_CHUNK_SIZE):
+    """
+    Yields lists of at most size values
+    """
+    values = list(values)
+    for i in xrange(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _id_map(key_column, id_column, keys, *criteria):
+    """
+    Returns {key: id} of rows whose key_column is in keys
+    """
+    ids = {}
+    for chunk in _chunks(set(keys)):
+        query = db.session.query(key_column, id_column).filter(key_column.in_(chunk), *criteria)
+        ids.update(query)
+    return ids
+
+
+def _upsert(model, key, rows, defaults=None):
+    """
+    Inserts rows missing in model and updates the others, both in bulk
+    :param model: model having id column
+    :param key: name of unique ERP id column
+    :param rows: {ERP id: dict of column values}
+    :param defaults: column values of inserted rows only
+    :return: set of ERP ids of inserted rows
+    """
+    ids = _id_map(getattr(model, key), model.id, rows)
+    new = set(erp_id for erp_id in rows if erp_id not in ids)
+    if new:
+        db.session.bulk_insert_mappings(model, [dict(defaults or {}, **dict(rows[erp_id], **{key: erp_id}))
+                                                for erp_id in new])
+    if ids:
+        db.session.bulk_update_mappings(model, [dict(rows[erp_id], id=ids[erp_id]) for erp_id in ids])
+    return new
+
+
+def _sync(records, validate, write, name):
+    """
+    Validates records and writes the valid ones in one transaction
+    :param records: list of dicts pushed by ERP, each with id
+    :param validate: function returning error message of a record, None if it is valid
+    :param write: function writing {ERP id: record} of valid records, returns set of inserted ERP ids
+    :param name: name of entity used in messages
+    :return: list of dicts with id, success and message, in order of records
+    """
+    results = []
+    valid = {}
+    for record in records:
+        error = validate(record) if isinstance(record, dict) else "Invalid %s data" % name.lower()
+        record_id = record.get('id') if isinstance(record, dict) else None
+        results.append(dict(id=record_id, success=error is None, message=error))
+        if error is None:
+            # last one wins if ERP pushes same record twice
+            valid[record_id] = record
+    if not valid:
+        return results
+
+    try:
+        new = write(valid)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for result in results:
+        if result['success']:
+            result['message'] = "%s %s" % (name, "Added" if result['id'] in new else "Updated")
+    return results
+
+
+def _taken_emails(model, records):
+    """
+    Returns {email: ERP id} of emails of records already used by other rows of model
+    """
+    return _id_map(model.tm_email_id, model.erp_user_id, _field_values(records, 'email', _is_text))
+
+
+def sync_users(users):
+    """
+    Adds or updates users, password is required for new users only
+    :param users: list of dicts with id, name, email, role, status and password, ids are ERP ids
+    :return: list of dicts with id, success and message, in order of users
+    """
+    existing = _id_map(Users.erp_user_id, Users.id, _field_values(users, 'id'))
+    emails = _taken_emails(Users, users)
+
+    def validate(user):
+        if not (user.get('id') and user.get('name') and user.get('email')):
+            return "Parameters Missing"
+        if not (_is_id(user['id']) and _is_text(user['name']) and _is_text(user['email'])):
+            return "Invalid id, name or email"
+        if 'role' in user and user['role'] not in ROLES:
+            return "Invalid role"
+        if user.get('password') is not None and not _is_text(user['password']):
+            return "Invalid password"
+        if user['id'] not in existing and not user.get('password'):
+            return "Password required for new user"
+        if emails.setdefault(user['email'], user['id']) != user['id']:
+            return "Email already used"
+        return None
+
+    def write(valid):
+        rows = {}
+        for erp_id, user in valid.items():
+            row = dict(erp_user_name=user['name'], tm_email_id=user['email'])
+            # role of existing user is kept if ERP does not send it
+            if 'role' in user:
+                row['tm_user_role'] = user['role']
+            if 'status' in user:
+                row['tm_user_status'] = bool(user['status'])
+            if user.get('password'):
+                row['tm_password'] = generate_password_hash(user['password'], method='sha256')
+            rows[erp_id] = row
+        return _upsert(Users, 'erp_user_id', rows, defaults=dict(tm_user_role=DEVELOPER))
+
+    return _sync(users, validate, write, "User")
+
+
+def sync_qas(qas):
+    """
+    Adds or updates qas
+    :param qas: list of dicts with id, name and email, ids are ERP ids
+    :return: list of dicts with id, success and message, in order of qas
+    """
+    emails = _taken_emails(Qa, qas)
+
+    def validate(qa):
+        if not (qa.get('id') and qa.get('name') and qa.get('email')):
+            return "Parameters Missing"
+        if not (_is_id(qa['id']) and _is_text(qa['name']) and _is_text(qa['email'])):
+            return "Invalid id, name or email"
+        if emails.setdefault(qa['email'], qa['id']) != qa['id']:
+            return "Email already used"
+        return None
+
+    def write(valid):
+        return _upsert(Qa, 'erp_user_id', dict((erp_id, dict(erp_user_name=qa['name'], tm_email_id=qa['email']))
+                                               for erp_id, qa in valid.items()))
+
+    return _sync(qas, validate, write, "QA")
+
+
+def _valid_milestone(milestone):
+    """
+    Returns true if milestone has ERP id and name
+    """
+    return isinstance(milestone, dict) and _is_id(milestone.get('id')) and _is_text(milestone.get('name'))
+
+
+def sync_milestones(milestones):
+    """
+    Adds or updates milestones of existing projects
+    :param milestones: list of dicts with id, name and project, ids are ERP ids
+    :return: list of dicts with id, success and message, in order of milestones
+    """
+    project_ids = _id_map(Projects.erp_project_id, Projects.id, _field_values(milestones, 'project'))
+
+    def validate(milestone):
+        if not (milestone.get('id') and milestone.get('name') and milestone.get('project')):
+            return "Parameters Missing"
+        if not _valid_milestone(milestone):
+            return "Invalid id or name"
+        if not _is_id(milestone['project']) or milestone['project'] not in project_ids:
+            return "Invalid project id"
+        return None
+
+    def write(valid):
+        # project is checked against project_ids, milestones store its ERP id
+        return _upsert(Milestones, 'erp_milestone_id', dict(
+            (erp_id, dict(tm_milestone_name=milestone['name'], tm_milestone_project_id=milestone['project']))
+            for erp_id, milestone in valid.items()))
+
+    return _sync(milestones, validate, write, "Milestone")
+
+
+def _replace_members(table, member_column, members):
+    """
+    Replaces members of projects with a diff of association rows
+    :param table: project_developer or project_qa
+    :param member_column: name of user column of table
+    :param members: {project id: set of member ids}
+    """
+    current = set()
+    for chunk in _chunks(members):
+        current.update(tuple(row) for row in db.session.execute(
+            select([table.c.tm_project_id, table.c[member_column]]).where(table.c.tm_project_id.in_(chunk))))
+    wanted = set((project_id, member_id) for project_id, member_ids in members.items() for member_id in member_ids)
+
+    removed = current - wanted
+    added = wanted - current
+    if removed:
+        db.session.execute(table.delete().where(and_(table.c.tm_project_id == bindparam('project_id'),
+                                                     table.c[member_column] == bindparam('member_id'))),
+                           [dict(project_id=project_id, member_id=member_id) for project_id, member_id in removed])
+    if added:
+        db.session.execute(table.insert(), [{'tm_project_id': project_id, member_column: member_id}
+                                            for project_id, member_id in added])
+
+
+def sync_projects(projects):
+    """
+    Adds or updates projects with their milestones, developers and qas, invalid projects are skipped
+    :param projects: list of dicts with id, name, milestones, developers and qas, ids are ERP ids
+    :return: list of dicts with id, success and message, in order of projects
+    """
+    developer_ids = _id_map(Users.erp_user_id, Users.id,
+                            [dev for developers in _field_values(projects, 'developers', _is_id_list)
+                             for dev in developers], Users.tm_user_role == DEVELOPER)
+    qa_ids = _id_map(Qa.erp_user_id, Qa.id, [qa for qas in _field_values(projects, 'qas', _is_id_list) for qa in qas])
+
+    def validate(project_data):
+        if not (project_data.get('id') and project_data.get('name') and project_data.get('milestones') and
+                project_data.get('developers')):
+            return "Parameters Missing"
+        if not (_is_id(project_data['id']) and _is_text(project_data['name'])):
+            return "Invalid id or name"
+        if not _is_id_list(project_data['developers']) or \
+                any(dev not in developer_ids for dev in project_data['developers']):
+            return "Invalid developer id"
+        qas = project_data.get('qas') or []
+        if not _is_id_list(qas) or any(qa not in qa_ids for qa in qas):
+            return "Invalid qa id"
+        if not (isinstance(project_data['milestones'], list) and
+                all(_valid_milestone(milestone) for milestone in project_data['milestones'])):
+            return "Invalid milestone"
+        return None
+
+    def write(valid):
+        new = _upsert(Projects, 'erp_project_id', dict((erp_id, dict(tm_project_name=project_data['name']))
+                                                       for erp_id, project_data in valid.items()),
+                      defaults=dict(tm_project_status=False))
+        project_ids = _id_map(Projects.erp_project_id, Projects.id, valid)
+
+        # milestones refer to their project by ERP project id, as everywhere else in the app
+        _upsert(Milestones, 'erp_milestone_id', dict(
+            (milestone['id'], dict(tm_milestone_name=milestone['name'], tm_milestone_project_id=erp_id))
+            for erp_id, project_data in valid.items() for milestone in project_data['milestones']))
+
+        _replace_members(project_developer, 'tm_developer_id', dict(
+            (project_ids[erp_id], set(developer_ids[dev] for dev in project_data['developers']))
+            for erp_id, project_data in valid.items()))
+        _replace_members(project_qa, 'tm_quality_assurer_id', dict(
+            (project_ids[erp_id], set(qa_ids[qa] for qa in project_data.get('qas') or []))
+            for erp_id, project_data in valid.items()))
+        return new
+
+    return _sync(projects, validate, write, "Project")
+
+
+# entities of sync stream, in the order buffered chunks are written so references are written first
+SYNCS = (('user', sync_users), ('qa', sync_qas), ('project', sync_projects), ('milestone', sync_milestones))
+
+
+def sync_stream(records, chunk_size=500):
+    """
+    Syncs stream of records, each having type 'user', 'qa', 'project' or 'milestone',
+    records are buffered by type and written in chunks, one transaction per type and chunk
+    :param records: iterable of dicts, or of error messages for records that could not be read
+    :param chunk_size: records buffered before writing
+    :return: dict of results by type, records of unknown type are reported under 'invalid'
+    """
+    buffers = dict((name, []) for name, _ in SYNCS)
+    results = dict((name, []) for name, _ in SYNCS)
+    results['invalid'] = []
+    buffered = 0
+
+    def flush():
+        for name, sync in SYNCS:
+            if buffers[name]:
+                try:
+                    results[name].extend(sync(buffers[name]))
+                except Exception as e:
+                    # only this chunk is lost, chunks before and after it are still written
+                    db.session.rollback()
+                    results[name].extend(dict(id=record.get('id'), success=False, message=str(e))
+                                         for record in buffers[name])
+                del buffers[name][:]
+
+    for line, record in enumerate(records, 1):
+        record_type = record.get('type') if isinstance(record, dict) else None
+        if not isinstance(record_type, basestring) or record_type not in buffers:
+            message = record if isinstance(record, basestring) else "Invalid type"
+            results['invalid'].append(dict(line=line, success=False, message=message))
+            continue
+        buffers[record_type].append(record)
+        buffered += 1
+        if buffered >= chunk_size:
+            flush()
+            buffered = 0
+    flush()
+    return results
+
+
+def summarize(results):
+    """
+    Counts results of sync_stream
+    :return: dict of {'succeeded': count, 'failed': count} by type
+    """
+    return dict((name, dict(succeeded=sum(1 for result in entity if result['success']),
+                            failed=sum(1 for result in entity if not result['success'])))
+                for name, entity in results.items())
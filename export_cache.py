@@ -0,0 +1,96 @@
+# coding=utf-8
+"""
+LRU cache of generated exports (XLS/XLSX/ZIP), keyed by action, date and a watermark of the exported tasks
+so a repeat download of unchanged tasks is sent without building workbooks again
+"""
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from sqlalchemy import func
+
+from models import Tasks
+
+_lock = threading.Lock()
+# key: (filename, content), least recently used first
+_exports = OrderedDict()
+_config = {'max_size': 0}
+# bytes of cached exports
+_size = 0
+
+
+def init_app(app):
+    """
+    Sets size cap of cache in bytes from EXPORT_CACHE_SIZE of app, 0 turns cache off
+    """
+    _config['max_size'] = app.config.get('EXPORT_CACHE_SIZE', 0)
+
+
+def watermark(query):
+    """
+    Returns (developer, project, task count, max id, last update) of each developer and project of tasks of query,
+    it changes whenever a task is added, deleted, moved to another developer/project or edited, also outside views
+    :param query: query of Tasks without options or ordering
+    """
+    return tuple(query.with_entities(Tasks.tm_developer, Tasks.tm_task_project_id, func.count(Tasks.id),
+                                     func.max(Tasks.id), func.max(Tasks.tm_updated_on)).group_by(
+        Tasks.tm_developer, Tasks.tm_task_project_id).order_by(Tasks.tm_developer, Tasks.tm_task_project_id))
+
+
+def get(key):
+    """
+    Returns cached export as (filename, buffer) or None
+    """
+    with _lock:
+        entry = _exports.pop(key, None)
+        if entry is None:
+            return None
+        _exports[key] = entry
+    filename, content = entry
+    return filename, BytesIO(content)
+
+
+def put(key, export):
+    """
+    Caches export, least recently used exports are evicted to keep total size under cap
+    :param key: (action, date, format, watermark, ...)
+    :param export: (filename, buffer) returned by generate_xls/generate_zip
+    :return: export, with buffer rewound
+    """
+    global _size
+    filename, output = export
+    content = output.getvalue()
+    output.seek(0)
+    if len(content) > _config['max_size']:
+        return export
+    with _lock:
+        old = _exports.pop(key, None)
+        if old is not None:
+            _size -= len(old[1])
+        _exports[key] = (filename, content)
+        _size += len(content)
+        while _size > _config['max_size']:
+            _, (_, evicted) = _exports.popitem(last=False)
+            _size -= len(evicted)
+    return export
+
+
+def cached(key, build):
+    """
+    Returns cached export of key, built by build() and cached on miss
+    """
+    export = get(key)
+    if export is None:
+        export = put(key, build())
+    return export
+
+
+def invalidate(date=None):
+    """
+    Drops cached exports of date, all of them if date is None
+    :param date: datetime.date, second item of keys
+    """
+    global _size
+    with _lock:
+        for key in [key for key in _exports if date is None or key[1] == date]:
+            _size -= len(_exports.pop(key)[1])
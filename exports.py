@@ -0,0 +1,90 @@
+# coding=utf-8
+"""
+Export planner for Task Manager, loads tasks once and partitions them for XLS/XLSX generation
+"""
+from itertools import groupby
+from operator import attrgetter
+
+from sqlalchemy.orm import joinedload
+
+from extras import generate_xls, generate_zip
+from models import Tasks
+
+
+def load_tasks(query):
+    """
+    Fetches tasks of query in one go along with their developer, project, milestone and QA
+    :param query: query of Tasks
+    :return: list of tasks ordered by id
+    """
+    return query.options(joinedload(Tasks.relative_developer), joinedload(Tasks.relative_project),
+                         joinedload(Tasks.relative_milestone), joinedload(Tasks.relative_qa)).order_by(
+        Tasks.id.asc()).all()
+
+
+def partition(tasks, *keys):
+    """
+    Sorts tasks by given attributes and yields them group by group
+    :param tasks: list of tasks
+    :param keys: attribute names of Tasks
+    """
+    key = attrgetter(*keys)
+    for value, group in groupby(sorted(tasks, key=key), key=key):
+        yield value, list(group)
+
+
+def date_wise(tasks, fmt='xls'):
+    """
+    One workbook per day
+    :param tasks:
+    :param fmt: format of workbooks, key of extras.WRITERS
+    :return: list of (filename, buffer)
+    """
+    return [generate_xls(tasks=group, action=0, fmt=fmt) for day, group in partition(tasks, 'tm_added_on')]
+
+
+def developer_wise(tasks, fmt='xls'):
+    """
+    One workbook per developer per project
+    :param tasks:
+    :param fmt: format of workbooks, key of extras.WRITERS
+    :return: list of (filename, buffer)
+    """
+    return [generate_xls(tasks=group, action=1, project=group[0].relative_project.erp_project_id, fmt=fmt)
+            for _, group in partition(tasks, 'tm_developer', 'tm_task_project_id')]
+
+
+def project_wise(tasks, fmt='xls'):
+    """
+    One workbook per project
+    :param tasks:
+    :param fmt: format of workbooks, key of extras.WRITERS
+    :return: list of (filename, buffer)
+    """
+    return [generate_xls(tasks=group, action=2, fmt=fmt)
+            for project, group in partition(tasks, 'tm_task_project_id')]
+
+
+def merged(tasks, fmt='xls'):
+    """
+    All tasks in a single workbook
+    :param tasks:
+    :param fmt: format of workbooks, key of extras.WRITERS
+    :return: (filename, buffer)
+    """
+    return generate_xls(tasks=tasks, action=3, fmt=fmt)
+
+
+def bundle(files, zip_name, always_zip=False):
+    """
+    Returns the only generated file as it is, otherwise ZIP of all files
+    :param files: list of (filename, buffer)
+    :param zip_name: name of ZIP without extension
+    :param always_zip: ZIP even a single file
+    :return: (filename, buffer)
+    """
+    if not files:
+        raise ValueError('There are no tasks to export')
+    if len(files) == 1 and not always_zip:
+        return files[0]
+    return generate_zip(zip_name=zip_name, files=files)
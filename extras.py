@@ -3,19 +3,17 @@
 Contains essential methods for Task Manager
 """
 import calendar
-import os
 import zipfile
 from datetime import datetime, timedelta
+from io import BytesIO
 
+import openpyxl
 import xlwt
-from PIL import Image, ImageDraw, ImageFont
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
 
-APP_ROOT = os.path.dirname(os.path.abspath(__file__))
-dp_target = os.path.join(APP_ROOT, 'static/images/user_images/')
-font_target = os.path.join(APP_ROOT, 'static/fonts/DP_FONT.ttf')
-
-APP_ROOT = os.path.dirname(os.path.abspath(__file__))
-target_save_path = os.path.join(APP_ROOT, 'xls_data/')
+from metrics import timed
 
 
 def get_str(_string):
@@ -29,47 +27,97 @@ def get_str(_string):
         return unicode(_string).encode('utf-8')
 
 
-def set_headers(ws):
-    """
-    Sets headers in XLS file
+HEADERS = ("Task_Title", "Milestone", "Start_Date (DD/MM/YYYY)", "End_Date (DD/MM/YYYY)",
+           "Estimated_Hours (HH:MM:SS)", "QA", "Developer", "Priority", "Type", "Description")
+DESCRIPTION_COLUMN = 9
+# in characters
+DESCRIPTION_WIDTH = 100
+
+
+class XlsWriter(object):
     """
-    style = xlwt.easyxf(
-        'font: bold on; pattern: pattern solid, fore_colour blue')
-    ws.write(0, 0, "Task_Title", style)
-    ws.write(0, 1, "Milestone", style)
-    ws.write(0, 2, "Start_Date (DD/MM/YYYY)", style)
-    ws.write(0, 3, "End_Date (DD/MM/YYYY)", style)
-    ws.write(0, 4, "Estimated_Hours (HH:MM:SS)", style)
-    ws.write(0, 5, "QA", style)
-    ws.write(0, 6, "Developer", style)
-    ws.write(0, 7, "Priority", style)
-    ws.write(0, 8, "Type", style)
-    ws.write(0, 9, "Description", style)
-
-
-def fill_xls(ws, row, task_title, milestone, start_date, end_date, estimated_hours, qa, _developer, priority, _type,
-             description):
+    Legacy XLS workbook, built in memory by xlwt and limited to 65536 rows
     """
-    For filling up XLS file
+    extension = '.xls'
+    header_style = xlwt.easyxf('font: bold on; pattern: pattern solid, fore_colour blue')
+
+    def __init__(self):
+        self.wb = xlwt.Workbook(encoding='utf-8')
+        self.ws = self.wb.add_sheet('Sheet1')
+        self.ws.col(DESCRIPTION_COLUMN).width = DESCRIPTION_WIDTH * 256
+        self.row = 0
+
+    def write_headers(self):
+        for col, header in enumerate(HEADERS):
+            self.ws.write(0, col, header, self.header_style)
+
+    def write_row(self, values):
+        self.row += 1
+        for col, value in enumerate(values):
+            self.ws.write(self.row, col, value)
+
+    def save(self, output):
+        self.wb.save(output)
+
+
+class XlsxWriter(object):
     """
-    ws.write(row, 0, task_title)
-    ws.write(row, 1, milestone)
-    ws.write(row, 2, start_date)
-    ws.write(row, 3, end_date)
-    ws.write(row, 4, estimated_hours)
-    ws.write(row, 5, qa)
-    ws.write(row, 6, _developer)
-    ws.write(row, 7, priority)
-    ws.write(row, 8, _type)
-    ws.col(9).width = 100 * 256
-    ws.write(row, 9, description.encode('utf-8').replace("\r\n", "").strip())
-
-
-def generate_xls(tasks, action, folder, project=None):
+    XLSX workbook in openpyxl's write-only mode, rows are streamed to a temporary file
+    so memory does not grow with number of rows
     """
+    extension = '.xlsx'
+
+    def __init__(self):
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet('Sheet1')
+        # column styles have to be set before any row is written
+        self.ws.column_dimensions[get_column_letter(DESCRIPTION_COLUMN + 1)].width = DESCRIPTION_WIDTH
+
+    def write_headers(self):
+        cells = []
+        for header in HEADERS:
+            cell = WriteOnlyCell(self.ws, value=header)
+            cell.font = Font(bold=True)
+            cell.fill = PatternFill('solid', fgColor='0000FF')
+            cells.append(cell)
+        self.ws.append(cells)
+
+    def write_row(self, values):
+        self.ws.append(values)
+
+    def save(self, output):
+        self.wb.save(output)
+
+
+# export format: writer
+WRITERS = {
+    'xls': XlsWriter,
+    'xlsx': XlsxWriter,
+}
+
 
+def format_task(task):
+    """
+    Returns values of task's row in order of HEADERS, same for every writer
+    :param task: task with developer, milestone and QA loaded
+    """
+    return (task.tm_task_title,
+            task.relative_milestone.tm_milestone_name,
+            '{0.day:02d}/{0.month:02d}/{0.year:4d}'.format(task.tm_start_date),
+            '{0.day:02d}/{0.month:02d}/{0.year:4d}'.format(task.tm_end_date),
+            task.tm_estimated_hours.strftime("%H:%M:%S"),
+            task.relative_qa.erp_user_name if task.tm_qa else "",
+            task.relative_developer.erp_user_name,
+            task.tm_priority.capitalize(),
+            task.tm_type.capitalize(),
+            task.tm_description.replace("\r\n", "").strip())
+
+
+@timed('xls')
+def generate_xls(tasks, action, project=None, fmt='xls'):
+    """
+    Builds workbook of tasks in memory
     :param project:
-    :param folder:
     :param tasks:
     :param action:
         date-wise : 0
@@ -77,32 +125,13 @@ def generate_xls(tasks, action, folder, project=None):
         project-wise : 2
         merged : 3
         all_of_day : 4
-    :return:
+    :param fmt: 'xls' or 'xlsx'
+    :return: (filename, buffer)
     """
-    wb = xlwt.Workbook(encoding='utf-8')
-    ws = wb.add_sheet('Sheet1')
-    set_headers(ws)
-    row = 0
-    for task in tasks:
-        if task.tm_qa:
-            qa = task.relative_qa.erp_user_name
-        else:
-            qa = ""
-        row = row + 1
-
-        fill_xls(ws, row,
-                 task.tm_task_title,
-                 task.relative_milestone.tm_milestone_name,
-                 '{0.day:02d}/{0.month:02d}/{0.year:4d}'.format(task.tm_start_date),
-                 '{0.day:02d}/{0.month:02d}/{0.year:4d}'.format(task.tm_end_date),
-                 task.tm_estimated_hours.strftime("%H:%M:%S"),
-                 qa,
-                 task.relative_developer.erp_user_name,
-                 task.tm_priority.capitalize(),
-                 task.tm_type.capitalize(),
-                 task.tm_description)
-    if not os.path.exists(target_save_path):
-        os.makedirs(target_save_path)
+    writer = WRITERS[fmt]()
+    writer.write_headers()
+    for values in (format_task(task) for task in tasks):
+        writer.write_row(values)
     filename = 'download'
     if action == 0:
         filename = str('{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(tasks[0].tm_added_on))
@@ -113,10 +142,10 @@ def generate_xls(tasks, action, folder, project=None):
         filename = str(tasks[0].relative_project.erp_project_id)
     elif action == 3:
         filename = 'Merged_tasks_' + str('{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
-    save_xls = target_save_path + folder + '/'
-    path = save_xls + filename + '.xls'
-    wb.save(path)
-    return path
+    output = BytesIO()
+    writer.save(output)
+    output.seek(0)
+    return filename + writer.extension, output
 
 
 def get_next_date():
@@ -132,51 +161,18 @@ def get_next_date():
     return next_date.date()
 
 
-def generate_zip(zip_name, user_folder):
+@timed('zip')
+def generate_zip(zip_name, files):
     """
-
+    Builds ZIP of generated files in memory
     :param zip_name:
-    :param user_folder:
-    :return:
+    :param files: list of (filename, buffer) returned by generate_xls
+    :return: (filename, buffer)
     """
-    zf = zipfile.ZipFile("zip_data/" + user_folder + zip_name + '.zip', "w")
-    for dirname, subdirs, files in os.walk("xls_data/" + user_folder):
-        for filename in files:
-            zf.write(os.path.join(dirname, filename))
+    output = BytesIO()
+    zf = zipfile.ZipFile(output, "w")
+    for filename, content in files:
+        zf.writestr(filename, content.getvalue())
     zf.close()
-    return zf.filename
-
-
-def generate_dp(username, user_id):
-    """
-    Generates dp
-    """
-    # for display picture icon
-    if not os.path.exists(dp_target):
-        os.makedirs(dp_target)
-
-    if username.split(" ")[1]:
-        name = username.split(" ")[0][0].upper() + username.split(" ")[1][0].upper()
-    else:
-        name = " " + username.split(" ")[0].upper()
-
-    w, h = (460, 460)
-    color = (255, 188, 22)
-    im = Image.new("RGBA", (w, h), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(im)
-
-    if ("MW" == name) or ("WM" == name):
-        w_h = ((w - 800 / 2) / 2, (h - 920 / 2) / 2)
-    elif any(i in name for i in 'MW'):
-        w_h = ((w - 650 / 2) / 2, (h - 920 / 2) / 2)
-    else:
-        w_h = ((w - 516 / 2) / 2, (h - 920 / 2) / 2)
-
-    if os.path.isfile(font_target):
-        font = ImageFont.truetype("static/fonts/DP_FONT.ttf", 250)
-        draw.text(w_h, name, fill=color, font=font)
-    else:
-        draw.text(w_h, name, fill=color)
-
-    filename = dp_target + str(user_id) + ".png"
-    im.save(filename, "PNG")
+    output.seek(0)
+    return zip_name + '.zip', output
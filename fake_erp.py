@@ -0,0 +1,92 @@
+# coding=utf-8
+"""
+Fake ERP for running "Add to ERP" offline, it mimics login, add task and logout pages of ERP
+To run server,
+    python fake_erp.py --port 8090 --latency 0.2 --failure-rate 0.1
+and point URL_ERP_LOGIN, URL_ADD_TASK and URL_ERP_LOGOUT of app.cfg to
+    http://localhost:8090/login, http://localhost:8090/tasks/add, http://localhost:8090/logout
+"""
+import argparse
+import random
+import threading
+import time
+
+from flask import Flask, abort, jsonify, redirect, request, session, url_for
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'fake-erp'
+app.config['LATENCY'] = 0.0
+app.config['FAILURE_RATE'] = 0.0
+
+lock = threading.Lock()
+stats = {'logins': 0, 'tasks': 0, 'failures': 0}
+
+
+def _delay():
+    """
+    Simulates latency of ERP
+    """
+    if app.config['LATENCY']:
+        time.sleep(app.config['LATENCY'])
+
+
+def _count(key):
+    with lock:
+        stats[key] += 1
+
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    """
+    Login page, any username/password is accepted
+    """
+    _delay()
+    if request.method == 'POST' and request.form.get('LoginForm[username]'):
+        session['logged_in'] = True
+        _count('logins')
+    return 'login'
+
+
+@app.route('/tasks/add/<int:project_id>', methods=['POST'])
+def add_task(project_id):
+    """
+    Add task page, redirects to login page when session is missing like ERP does
+    """
+    _delay()
+    if not session.get('logged_in'):
+        return redirect(url_for('login'))
+    if random.random() < app.config['FAILURE_RATE']:
+        _count('failures')
+        abort(500)
+    _count('tasks')
+    return 'added'
+
+
+@app.route('/logout')
+def logout():
+    """
+    Logout page
+    """
+    _delay()
+    session.pop('logged_in', None)
+    return 'logout'
+
+
+@app.route('/stats')
+def get_stats():
+    """
+    Returns number of logins, added tasks and injected failures
+    """
+    with lock:
+        return jsonify(**stats)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake ERP server')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of add task requests failing')
+    args = parser.parse_args()
+    app.config['LATENCY'] = args.latency
+    app.config['FAILURE_RATE'] = args.failure_rate
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
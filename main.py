@@ -4,16 +4,14 @@ Task Manager implemented using flask admin
 To run server,
     python main.py
 """
-import cookielib
-import glob
 import os
-import urllib
-import urllib2
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
+import click
 import flask_admin as admin
-from flask import Flask, after_this_request, flash, json, jsonify, redirect, render_template, request, send_file, \
-    url_for
+from flask import Flask, Response, flash, json, jsonify, redirect, render_template, request, send_file, \
+    stream_with_context, url_for
 from flask_admin import expose, helpers
 from flask_admin.actions import action
 from flask_admin.contrib import sqla
@@ -21,37 +19,57 @@ from flask_admin.contrib.sqla import validators
 from flask_admin.form import TimeField, rules
 from flask_login import LoginManager, current_user, login_required, login_user, logout_user
 from markupsafe import Markup
-from sqlalchemy import func
+from sqlalchemy import func, inspect
+from sqlalchemy.schema import CreateColumn
 from werkzeug.security import check_password_hash, generate_password_hash
 from wtforms import PasswordField, TextAreaField, validators as wtf_validator
 from wtforms.validators import DataRequired
 
-from extras import generate_dp, generate_xls, generate_zip
+import count_cache
+import export_cache
+import metrics
+import sql_profiler
+from analytics import report as estimated_hours_report
+from auth import ADMIN, DEVELOPER, get_user, is_admin, is_developer
+from avatars import get_avatar, rebuild_avatars
+from count_cache import cached_count
+from dashboard import get_attendance, get_developer_tasks
+from denormalize import rebuild_daily_summary, refresh_daily_summary, refresh_latest_task
+from erp_jobs import enqueue_tasks, requeue_jobs, run_worker
+from erp_sync import summarize, sync_projects, sync_stream
+from extras import WRITERS
+from exports import bundle, date_wise, developer_wise, load_tasks, merged, project_wise
 from forms import LoginForm
-from models import Milestones, Projects, Qa, Tasks, Users, db
+from models import DailyTaskSummary, ErpJobs, Milestones, Projects, Qa, Tasks, Users, db
+from pagination import add_cursor, decode_cursor, encode_cursor, seek_filter
+from streaming import FORMATS as STREAM_FORMATS, task_rows
 
 # Create Flask application
 app = Flask(__name__)
 app.config.from_pyfile('app.cfg')
 
 db.init_app(app)
+sql_profiler.init_app(app)
+metrics.init_app(app)
+export_cache.init_app(app)
 
-APP_ROOT = os.path.dirname(os.path.abspath(__file__))
-target_save_path_xls = os.path.join(APP_ROOT, 'xls_data/')
-target_save_path_zip = os.path.join(APP_ROOT, 'zip_data/')
 
-ADMIN = 'admin'
-DEVELOPER = 'developer'
+def workbook_format(action):
+    """
+    Format of workbooks of export action, ?format=xls|xlsx of request overrides EXPORT_FORMATS of config
+    :param action: e.g. 'all', 'project', 'export_date'
+    """
+    fmt = request.args.get('format') or app.config['EXPORT_FORMATS'].get(action, 'xls')
+    return fmt if fmt in WRITERS else 'xls'
 
-URL_ERP_LOGIN = app.config['URL_ERP_LOGIN']
-URL_VIEW_PROFILE = app.config['URL_VIEW_PROFILE']
-URL_ADD_TASK = app.config['URL_ADD_TASK']
-URL_ERP_LOGOUT = app.config['URL_ERP_LOGOUT']
 
-LOGIN_INFO = {
-    'LoginForm[username]': app.config['USERNAME'],
-    'LoginForm[password]': app.config['PASSWORD']
-}
+def send_export(export):
+    """
+    Sends generated XLS/XLSX/ZIP to browser as attachment
+    :param export: (filename, buffer) returned by generate_xls/generate_zip
+    """
+    filename, output = export
+    return send_file(output, as_attachment=True, attachment_filename=filename)
 
 
 def init_login():
@@ -85,6 +103,18 @@ def index():
         return redirect(url_for('login'))
 
 
+@app.route('/avatar/<int:user_id>.png')
+@login_required
+def avatar(user_id):
+    """
+    Avatar of user, rendered on first request
+    :param user_id:
+    """
+    user = Users.query.get_or_404(user_id)
+    return send_file(get_avatar(user.erp_user_name), mimetype='image/png', conditional=True,
+                     cache_timeout=app.config['AVATAR_CACHE_TIMEOUT'])
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """
@@ -118,35 +148,14 @@ def logout():
     return redirect(url_for('login'))
 
 
-def add_modify_project_api(project_obj, developers, qas):
-    """
-    Updates project with given developers and qas
-    :param project_obj:
-    :param developers:
-    :param qas:
-    """
-    project_obj.tm_developer_id[:] = []
-    project_obj.tm_quality_assurer_id[:] = []
-
-    for dev_id in developers:
-        developer_obj = Users.query.filter_by(erp_user_id=dev_id).first()
-        project_obj.tm_developer_id.append(developer_obj)
-    for qa_id in qas:
-        qa_obj = Users.query.filter_by(erp_user_id=qa_id).first()
-        project_obj.tm_quality_assurer_id.append(qa_obj)
-
-    db.session.commit()
-
-
 @app.route('/login_api', methods=['GET', 'POST'])
 def login_api():
     """
     Login api used by TL to login from ERP
     """
     if current_user.get_id():
-        user = Users.query.filter_by(id=current_user.get_id()).first()
-        if user:
-            if not user.tm_user_role == ADMIN:
+        if get_user():
+            if not is_admin():
                 return jsonify(success=False, message="Admin Login Required")
             else:
                 return jsonify(success=True, message="Already Logged In")
@@ -172,85 +181,33 @@ def login_api():
 @app.route('/update_project_api', methods=['GET', 'POST'])
 def update_project_api():
     """
-    It will update projects when API is called from ERP
+    It will update projects when API is called from ERP, a project or a list of projects is read from
+    JSON body or json_data parameter, each with id, name, milestones, developers and qas
     :return:
     """
     if not current_user.is_authenticated:
         return jsonify(success=False, message="Login Required")
     else:
-        user = Users.query.filter_by(id=current_user.get_id()).first()
-        if user:
-            if user.tm_user_role == ADMIN:
-                json_data = request.args.get('json_data', default=False)
-                if json_data:
-                    project_data = json.loads(json_data)
-                    project_id = project_data['id']
-                    project_name = project_data['name']
-                    project_milestones = project_data['milestones']
-                    project_developers = project_data['developers']
-                    project_qas = project_data['qas']
-
-                    if project_id and project_name and project_milestones and project_developers:
-
-                        all_milestone = [milestone.erp_milestone_id for milestone in Milestones.query.all()]
-                        all_developer = [dev.erp_user_id for dev in Users.query.filter_by(tm_user_role=DEVELOPER).all()]
-                        all_qa = [qa.erp_user_id for qa in Qa.query.all()]
-
-                        for dev in project_developers:
-                            if dev not in all_developer:
-                                return jsonify(success=False, message="Invalid developer id")
-
-                        for qa in project_qas:
-                            if qa not in all_qa:
-                                return jsonify(success=False, message="Invalid qa id")
-
-                        db.session.commit()
-                        erp_milestones = [milestone['id'] for milestone in project_milestones]
-
-                        project_obj = Projects.query.filter_by(erp_project_id=project_id).first()
-                        if project_obj:
-                            try:
-                                project_obj.tm_project_name = project_name
-                                add_modify_project_api(project_obj, developers=project_developers, qas=project_qas)
-                                db.session.commit()
-
-                                for milestone in project_milestones:
-                                    if milestone['id'] not in all_milestone:
-                                        try:
-                                            m_obj = Milestones(erp_milestone_id=milestone['id'],
-                                                               tm_milestone_name=milestone['name'],
-                                                               tm_milestone_project_id=project_obj.erp_project_id)
-                                            db.session.add(m_obj)
-                                            db.session.commit()
-                                        except Exception as e:
-                                            db.session.rollback()
-                                            return jsonify(success=False, message=str(e))
-                                    else:
-                                        try:
-                                            m_obj = Milestones.query.filter_by(erp_milestone_id=milestone['id']).first()
-                                            m_obj.tm_milestone_name = milestone['name']
-                                            db.session.commit()
-                                        except Exception as e:
-                                            db.session.rollback()
-                                            return jsonify(success=False, message=str(e))
-
-                                return jsonify(success=True, message="Project Updated")
-                            except Exception as e:
-                                db.session.rollback()
-                                return jsonify(success=False, message=str(e))
-                        else:
-
-                            try:
-                                project_obj = Projects(tm_project_name=project_name, erp_project_id=project_id,
-                                                       tm_project_status=False)
-                                db.session.add(project_obj)
-                                db.session.commit()
-                                add_modify_project_api(project_obj, milestones=erp_milestones,
-                                                       developers=project_developers, qas=project_qas)
-                                return jsonify(success=True, message="Project Added")
-                            except Exception as e:
-                                db.session.rollback()
-                                return jsonify(success=False, message=str(e))
+        if get_user():
+            if is_admin():
+                project_data = request.get_json(silent=True)
+                json_data = request.values.get('json_data', default=False)
+                if project_data is None and json_data:
+                    try:
+                        project_data = json.loads(json_data)
+                    except ValueError:
+                        return jsonify(success=False, message="Invalid JSON data")
+                if project_data:
+                    projects = project_data if isinstance(project_data, list) else [project_data]
+                    try:
+                        results = sync_projects(projects)
+                    except Exception as e:
+                        return jsonify(success=False, message=str(e))
+                    count_cache.invalidate()
+                    export_cache.invalidate()
+                    if isinstance(project_data, list):
+                        return jsonify(success=all(result['success'] for result in results), results=results)
+                    return jsonify(success=results[0]['success'], message=results[0]['message'])
                 else:
                     return jsonify(success=False, message="JSON data missing")
             else:
@@ -259,6 +216,51 @@ def update_project_api():
     return jsonify(success=False, message="Login Required")
 
 
+def read_ndjson(stream):
+    """
+    Yields records of newline delimited JSON stream, error message for lines which are not valid JSON
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield "Invalid JSON"
+
+
+@app.route('/sync', methods=['POST'])
+def sync():
+    """
+    Bulk sync API called from ERP, body is newline delimited JSON of users, qas, projects and milestones,
+    each line having type and fields of that entity
+    :return: counts and results of each entity by type, invalid records are reported one by one
+    """
+    if not current_user.is_authenticated:
+        return jsonify(success=False, message="Login Required")
+    if not is_admin():
+        return jsonify(success=False, message="Admin Login Required")
+
+    try:
+        results = sync_stream(read_ndjson(request.stream), chunk_size=app.config['SYNC_CHUNK_SIZE'])
+    except Exception as e:
+        return jsonify(success=False, message=str(e))
+    count_cache.invalidate()
+    export_cache.invalidate()
+    return jsonify(success=all(result['success'] for entity in results.values() for result in entity),
+                   counts=summarize(results), results=results)
+
+
+def _tasks_of_active_developers(date):
+    """
+    Query of tasks of given day of active developers
+    :param date: datetime.date
+    """
+    return Tasks.query.join(Users, Tasks.tm_developer == Users.id).filter(Tasks.tm_added_on == date,
+                                                                         Users.tm_user_status == True)
+
+
 class MainView(admin.AdminIndexView):
     """
     Team Leader View
@@ -273,25 +275,15 @@ class MainView(admin.AdminIndexView):
         """
         :return:
         """
-        user = Users.query.filter_by(id=current_user.get_id()).first()
-        if user.tm_user_role == ADMIN:
+        user = get_user()
+        if is_admin():
             if request.method == "GET":
                 date = '{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(datetime.now().date())
             else:
                 date = request.form['quick_date']
-            all_tasks = Users.query.filter_by(tm_user_role=DEVELOPER, tm_user_status=True).order_by(
-                Users.erp_user_name.asc()).all()
-            present = []
-            absent = []
-            for task in all_tasks:
-                last_id = Tasks.query.filter_by(tm_developer=task.id,
-                                                tm_added_on=datetime.strptime(date, "%d-%m-%Y").date()).first()
-                if last_id:
-                    present.append(last_id)
-                else:
-                    absent.append(task)
+            present, absent = get_attendance(datetime.strptime(date, "%d-%m-%Y").date())
             self._template_args['user'] = user
-            self._template_args['all_users'] = all_tasks
+            self._template_args['all_users'] = present + absent
             self._template_args['date'] = date
             self._template_args['present'] = present
             self._template_args['absent'] = absent
@@ -300,20 +292,12 @@ class MainView(admin.AdminIndexView):
                 date = '{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(datetime.now().date())
             else:
                 date = request.form['quick_date']
-            all_tasks = Tasks.query.filter_by(tm_developer=current_user.id,
-                                              tm_added_on=datetime.strptime(date, "%d-%m-%Y").date())
-            present = []
-            absent = []
-            for task in all_tasks.all():
-                if task.erp_task_status:
-                    present.append(task)
-                else:
-                    absent.append(task)
+            present, absent = get_developer_tasks(current_user.id, datetime.strptime(date, "%d-%m-%Y").date())
             self._template_args['user'] = user
             self._template_args['date'] = date
             self._template_args['present'] = present
             self._template_args['absent'] = absent
-            self._template_args['is_there_tasks'] = bool(all_tasks.first())
+            self._template_args['is_there_tasks'] = bool(present or absent)
         return super(MainView, self).index()
 
     @expose('/action/all', methods=['GET', 'POST'])
@@ -322,77 +306,28 @@ class MainView(admin.AdminIndexView):
         For admin dashboard/developer dashboard, download all tasks per date functionality
         :return:
         """
-
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(zip_save_path)
-                zip_files = glob.glob('*.zip')
-                for _zip in zip_files:
-                    os.unlink(_zip)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
         if current_user.is_authenticated:
             date = datetime.strptime(request.args.get('date'), '%d-%m-%Y')
             if date:
-                os.chdir(APP_ROOT)
-                user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-                xls_save_path = target_save_path_xls + user_folder
-                zip_save_path = target_save_path_zip + user_folder
                 try:
-                    if not os.path.exists(xls_save_path):
-                        os.makedirs(xls_save_path)
-                    if not os.path.exists(zip_save_path):
-                        os.makedirs(zip_save_path)
-                except Exception as e:
-                    flash('Failed to create/locate XLS/ZIP saving path. ' + str(e))
-
-                try:
-                    if current_user.tm_user_role == ADMIN:
-                        all_tasks = Tasks.query.filter_by(tm_added_on=date.date())
-                        tasks_by_dev = sorted(set(
-                            [task.tm_developer for task in all_tasks.all() if task.relative_developer.tm_user_status]))
-                        for dev in tasks_by_dev:
-                            project_of_dev = sorted(
-                                set([task.tm_task_project_id for task in all_tasks.filter_by(tm_developer=dev).all()]))
-                            for project in project_of_dev:
-                                project_id = Projects.query.get(project)
-                                tasks_of_dev = all_tasks.filter_by(tm_developer=dev, tm_task_project_id=project).all()
-                                filename = generate_xls(tasks=tasks_of_dev, action=1, folder=user_folder,
-                                                        project=project_id.erp_project_id)
-                        z_name = "/Tasks_dev_wise_of_" + str(
+                    fmt = workbook_format('all')
+                    if is_admin():
+                        query = _tasks_of_active_developers(date.date())
+                        z_name = "Tasks_dev_wise_of_" + str(
                             '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(date.date()))
-                        download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                        filename = APP_ROOT + "/" + download_file
                     else:
-                        all_tasks = Tasks.query.filter_by(tm_added_on=date.date(), tm_developer=current_user.id)
-                        project_of_dev = sorted(set([task.tm_task_project_id for task in all_tasks.all()]))
-                        for project in project_of_dev:
-                            project_id = Projects.query.get(project)
-                            tasks_of_dev = all_tasks.filter_by(tm_task_project_id=project).all()
-                            filename = generate_xls(tasks=tasks_of_dev, action=1, folder=user_folder,
-                                                    project=project_id.erp_project_id)
-                        if len(project_of_dev) > 1:
-                            z_name = "/" + all_tasks.first().relative_developer.erp_user_name + '_' + str(date.date())
-                            download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                            filename = APP_ROOT + "/" + download_file
-
-                    return send_file(filename_or_fp=filename, as_attachment=True,
-                                     attachment_filename=filename.split("/")[-1])
+                        query = Tasks.query.filter_by(tm_added_on=date.date(), tm_developer=current_user.id)
+                        z_name = current_user.erp_user_name + '_' + str(date.date())
+
+                    def build():
+                        return bundle(developer_wise(load_tasks(query), fmt), zip_name=z_name,
+                                      always_zip=is_admin())
+
+                    return send_export(export_cache.cached(
+                        ('all', date.date(), fmt, export_cache.watermark(query), is_admin()), build))
 
                 except Exception as ex:
-                    if current_user.tm_user_role == ADMIN:
+                    if is_admin():
                         flash('Failed to add tasks to XLS. ' + str(ex))
                     else:
                         flash('Failed to add tasks to XLS.')
@@ -405,59 +340,21 @@ class MainView(admin.AdminIndexView):
         For admin dashboard, download all tasks per date project-wise functionality
         :return:
         """
-
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(zip_save_path)
-                zip_files = glob.glob('*.zip')
-                for _zip in zip_files:
-                    os.unlink(_zip)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
         if current_user.is_authenticated:
-            if current_user.tm_user_role == ADMIN:
+            if is_admin():
                 date = datetime.strptime(request.args.get('date'), '%d-%m-%Y')
                 if date:
-                    user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-                    xls_save_path = target_save_path_xls + user_folder
-                    zip_save_path = target_save_path_zip + user_folder
-
                     try:
-                        if not os.path.exists(xls_save_path):
-                            os.makedirs(xls_save_path)
-                        if not os.path.exists(zip_save_path):
-                            os.makedirs(zip_save_path)
-                    except Exception as e:
-                        flash('Failed to create/locate XLS/ZIP saving path. ' + str(e))
+                        fmt = workbook_format('project')
+                        query = _tasks_of_active_developers(date.date())
+                        z_name = "Tasks_project_wise_of_" + str(
+                            '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(date.date()))
 
-                    try:
-                        all_tasks = Tasks.query.filter_by(tm_added_on=date.date())
-                        tasks_by_project = sorted(set([task.tm_task_project_id for task in all_tasks.all()]))
-                        for project in tasks_by_project:
-                            tasks_of_project = [task for task in all_tasks.filter_by(tm_task_project_id=project).all()
-                                                if task.relative_developer.tm_user_status]
-                            filename = generate_xls(tasks_of_project, action=2, folder=user_folder)
-
-                        if len(tasks_by_project) > 1:
-                            z_name = "/Tasks_project_wise_of_" + str(
-                                '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(date.date()))
-                            download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                            filename = APP_ROOT + "/" + download_file
-
-                        return send_file(filename_or_fp=filename, as_attachment=True,
-                                         attachment_filename=filename.split("/")[-1])
+                        def build():
+                            return bundle(project_wise(load_tasks(query), fmt), zip_name=z_name)
+
+                        return send_export(export_cache.cached(
+                            ('project', date.date(), fmt, export_cache.watermark(query)), build))
 
                     except Exception as ex:
                         flash('Failed to add tasks to XLS. ' + str(ex))
@@ -468,61 +365,17 @@ class MainView(admin.AdminIndexView):
         """
         :return:
         """
-
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(zip_save_path)
-                zip_files = glob.glob('*.zip')
-                for _zip in zip_files:
-                    os.unlink(_zip)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
         if current_user.is_authenticated:
-            if current_user.tm_user_role == ADMIN:
+            if is_admin():
                 date = datetime.strptime(request.args.get('date'), '%d-%m-%Y')
                 developer = request.args.get('developer')
                 if date:
-                    user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-                    xls_save_path = target_save_path_xls + user_folder
-                    zip_save_path = target_save_path_zip + user_folder
                     try:
-                        if not os.path.exists(xls_save_path):
-                            os.makedirs(xls_save_path)
-                        if not os.path.exists(zip_save_path):
-                            os.makedirs(zip_save_path)
-                    except Exception as e:
-                        flash('Failed to create/locate XLS/ZIP saving path. ' + str(e))
+                        all_tasks = load_tasks(Tasks.query.filter_by(tm_added_on=date.date(), tm_developer=developer))
+                        z_name = all_tasks[0].relative_developer.erp_user_name + '_' + str(date.date())
 
-                    try:
-                        all_tasks = Tasks.query.filter_by(tm_added_on=date.date(), tm_developer=developer)
-                        project_of_dev = sorted(
-                            set([task.tm_task_project_id for task in
-                                 all_tasks.filter_by(tm_developer=developer).all()]))
-                        for project in project_of_dev:
-                            project_id = Projects.query.get(project)
-                            tasks_of_dev = all_tasks.filter_by(tm_developer=developer, tm_task_project_id=project).all()
-                            filename = generate_xls(tasks=tasks_of_dev, action=1, folder=user_folder,
-                                                    project=project_id.erp_project_id)
-
-                        if len(project_of_dev) > 1:
-                            z_name = "/" + all_tasks.first().relative_developer.erp_user_name + '_' + str(date.date())
-                            download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                            filename = APP_ROOT + "/" + download_file
-
-                        return send_file(filename_or_fp=filename, as_attachment=True,
-                                         attachment_filename=filename.split("/")[-1])
+                        return send_export(bundle(developer_wise(all_tasks, workbook_format('developer')),
+                                                  zip_name=z_name))
 
                     except Exception as ex:
                         flash('Failed to add tasks to XLS. ' + str(ex))
@@ -535,77 +388,63 @@ class MainView(admin.AdminIndexView):
         For admin dashboard/ developer dashboard, download all tasks per date functionality
         :return:
         """
-
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(zip_save_path)
-                zip_files = glob.glob('*.zip')
-                for _zip in zip_files:
-                    os.unlink(_zip)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
         if current_user.is_authenticated:
-            os.chdir(APP_ROOT)
-            user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-            xls_save_path = target_save_path_xls + user_folder
-            zip_save_path = target_save_path_zip + user_folder
-            try:
-                if not os.path.exists(xls_save_path):
-                    os.makedirs(xls_save_path)
-                if not os.path.exists(zip_save_path):
-                    os.makedirs(zip_save_path)
-            except Exception as e:
-                flash('Failed to create/locate XLS/ZIP saving path. ' + str(e))
-
             try:
                 developer = request.args.get('developer')
                 if developer:
-                    if current_user.tm_user_role == ADMIN:
-                        all_tasks = Tasks.query.filter_by(tm_developer=developer)
-                        user = Users.query.filter_by(id=developer).first()
-                        if user:
-                            z_name = "/All_Tasks_of_" + user.erp_user_name.replace(" ", "_") + str(
-                                '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
-                        else:
-                            z_name = "/All_Tasks" + str(
-                                '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
+                    if is_admin():
+                        all_tasks = load_tasks(Tasks.query.filter_by(tm_developer=developer))
+                        if all_tasks:
+                            z_name = "All_Tasks_of_" + all_tasks[0].relative_developer.erp_user_name.replace(
+                                " ", "_") + str('{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
                     else:
-                        all_tasks = Tasks.query.filter_by(tm_developer=current_user.id)
-                        z_name = "/All_Tasks_" + current_user.erp_user_name.replace(" ", '_') + '_' + str(
+                        all_tasks = load_tasks(Tasks.query.filter_by(tm_developer=current_user.id))
+                        z_name = "All_Tasks_" + current_user.erp_user_name.replace(" ", '_') + '_' + str(
                             '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
 
-                    if all_tasks.first():
-                        project_of_dev = sorted(set([task.tm_task_project_id for task in all_tasks.all()]))
-                        for project in project_of_dev:
-                            project_id = Projects.query.get(project)
-                            tasks_of_dev = all_tasks.filter_by(tm_task_project_id=project).all()
-                            filename = generate_xls(tasks=tasks_of_dev, action=1, folder=user_folder,
-                                                    project=project_id.erp_project_id)
-
-                        download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                        zip_filename = APP_ROOT + "/" + download_file
-
-                        return send_file(filename_or_fp=zip_filename, as_attachment=True,
-                                         attachment_filename=zip_filename.split("/")[-1])
+                    if all_tasks:
+                        return send_export(bundle(developer_wise(all_tasks, workbook_format('developer_all')),
+                                                  zip_name=z_name, always_zip=True))
                     else:
                         flash("Developer doesn't have any tasks")
-            except Exception as ex:
+            except Exception:
                 flash('Failed to add tasks to XLS.')
 
         return redirect(url_for('admin.index'))
 
+    @expose('/action/stream', methods=['GET'])
+    def action_stream(self):
+        """
+        Streams whole task history as CSV or NDJSON, of given developer and/or date for admin,
+        of current user for developers
+        :return:
+        """
+        if not current_user.is_authenticated:
+            return redirect(url_for('login'))
+        export_format = request.args.get('format', 'csv')
+        if export_format not in STREAM_FORMATS:
+            flash('Invalid export format.')
+            return redirect(url_for('admin.index'))
+
+        criteria = []
+        name = "All_Tasks"
+        developer = request.args.get('developer') if is_admin() else current_user.id
+        if developer:
+            criteria.append(Tasks.tm_developer == developer)
+            name += "_of_" + str(developer)
+        if request.args.get('date'):
+            try:
+                date = datetime.strptime(request.args['date'], '%d-%m-%Y').date()
+            except ValueError:
+                flash('Invalid date!')
+                return redirect(url_for('admin.index'))
+            criteria.append(Tasks.tm_added_on == date)
+            name += "_" + str('{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(date))
+
+        lines, mimetype = STREAM_FORMATS[export_format]
+        return Response(stream_with_context(lines(task_rows(*criteria))), mimetype=mimetype,
+                        headers={'Content-Disposition': 'attachment; filename=%s.%s' % (name, export_format)})
+
 
 class StandardModelView(sqla.ModelView):
     """
@@ -622,6 +461,39 @@ class StandardModelView(sqla.ModelView):
 
     page_size = 20
 
+    # seconds for which count of a list view is reused, 0 disables caching
+    count_cache_ttl = app.config['COUNT_CACHE_TTL']
+
+    @cached_count
+    def get_count_query(self):
+        """
+        Cached count query
+        :return:
+        """
+        return super(StandardModelView, self).get_count_query()
+
+    def after_model_change(self, form, model, is_created):
+        """
+        Drops cached counts and exports
+        """
+        count_cache.invalidate()
+        self._invalidate_exports(model)
+        super(StandardModelView, self).after_model_change(form, model, is_created)
+
+    def after_model_delete(self, model):
+        """
+        Drops cached counts and exports
+        """
+        count_cache.invalidate()
+        self._invalidate_exports(model)
+        super(StandardModelView, self).after_model_delete(model)
+
+    def _invalidate_exports(self, model):
+        """
+        Drops all cached exports, names of users, projects and milestones are in all of them
+        """
+        export_cache.invalidate()
+
 
 class AdminDeveloperView(StandardModelView):
     """
@@ -673,8 +545,12 @@ class AdminDeveloperView(StandardModelView):
                     'Download ALL &nbsp; <i class="fa fa-download" aria-hidden="true"></i></button>'
             a_tag1 = "<a href='%s' title='%s'>%s</a> " % (url1, str('{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(
                 model.tm_latest_task)), icon1)
-            a_tag2 = "<a href='%s' title='Download ALL'>%s</a>" % (url2, icon2)
-            markupstring = a_tag1 + a_tag2
+            a_tag2 = "<a href='%s' title='Download ALL'>%s</a> " % (url2, icon2)
+            url3 = url_for('admin.action_stream', developer=model.id)
+            icon3 = '<button type="button" class="btn btn-default btn-sm">' \
+                    'CSV &nbsp; <i class="fa fa-download" aria-hidden="true"></i></button>'
+            a_tag3 = "<a href='%s' title='Download whole history as CSV'>%s</a>" % (url3, icon3)
+            markupstring = a_tag1 + a_tag2 + a_tag3
             return Markup(markupstring)
         else:
             return ""
@@ -731,10 +607,7 @@ class AdminDeveloperView(StandardModelView):
         Accessibility of the view
         :return:
         """
-        if current_user.is_authenticated:
-            if current_user.tm_user_role == ADMIN:
-                return current_user.is_authenticated
-        return False
+        return is_admin()
 
     def get_query(self):
         """
@@ -743,6 +616,7 @@ class AdminDeveloperView(StandardModelView):
         """
         return self.session.query(self.model).filter(self.model.tm_user_role == DEVELOPER)
 
+    @cached_count
     def get_count_query(self):
         """
         Count of custom query result
@@ -792,10 +666,7 @@ class AdminQAView(StandardModelView):
         Accessibility of the view
         :return:
         """
-        if current_user.is_authenticated:
-            if current_user.tm_user_role == ADMIN:
-                return current_user.is_authenticated
-        return False
+        return is_admin()
 
 
 class AdminMilestoneView(StandardModelView):
@@ -859,10 +730,7 @@ class AdminMilestoneView(StandardModelView):
         Accessibility of the view
         :return:
         """
-        if current_user.is_authenticated:
-            if current_user.tm_user_role == ADMIN:
-                return current_user.is_authenticated
-        return False
+        return is_admin()
 
 
 def filtering_developers():
@@ -933,16 +801,21 @@ class AdminProjectView(StandardModelView):
         Accessibility of the view
         :return:
         """
-        if current_user.is_authenticated:
-            if current_user.tm_user_role == ADMIN:
-                return current_user.is_authenticated
-        return False
+        return is_admin()
 
 
 def _format_to_standard_date(date):
     return str('{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(date))
 
 
+def _previous_value(model, name):
+    """
+    Returns value of column before form changed it, foreign keys keep old value until flush
+    """
+    history = inspect(model).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(model, name)
+
+
 class StandardTaskView(StandardModelView):
     """
     Standard Task View for Task Manager
@@ -973,6 +846,15 @@ class StandardTaskView(StandardModelView):
 
     column_details_exclude_list = ('erp_task_status',)
 
+    # relationships shown in list view, loaded along with tasks instead of one query per row
+    column_select_related_list = ('relative_project', 'relative_milestone', 'relative_qa')
+
+    # key columns of seek pagination in default sort order e.g. ('id',) or ('tm_added_on', 'id'),
+    # None keeps OFFSET pagination
+    keyset_columns = None
+
+    list_template = 'admin/model/keyset_list.html'
+
     column_default_sort = ('id', True)
 
     column_sortable_list = None
@@ -1018,11 +900,14 @@ class StandardTaskView(StandardModelView):
         """
         If end date before start date, flag them invalid. And if task is submitted in ERP, flag them invalid
         """
+        # day and developer task is moved from, their summary is refreshed too
+        model._previous_summary_key = None if is_created else (_previous_value(model, 'tm_added_on'),
+                                                               _previous_value(model, 'tm_developer'))
         try:
             if is_created:
                 model.tm_added_on = datetime.now().date()
             if not model.erp_task_status:
-                if current_user.tm_user_role == DEVELOPER:
+                if is_developer():
                     model.tm_developer = current_user.id
                     if form.relative_project.data:
                         project = Projects.query.filter_by(id=form.relative_project.data.id,
@@ -1054,61 +939,101 @@ class StandardTaskView(StandardModelView):
         except AttributeError:
             super(StandardTaskView, self).on_model_change(form, model, is_created)
 
-    @action('export_date', 'Generate XLS [date-wise]', 'Are you sure you want to generate XLS for selected tasks?')
-    def action_export_date_wise(self, ids):
+    def _get_seek_key(self):
         """
-        date-wise action 0
-        :param ids:
+        Returns key of last row of previous page from cursor, None if OFFSET pagination is to be used
         """
+        cursor = request.args.get('cursor')
+        if self.keyset_columns and cursor and not request.args.get('sort'):
+            return decode_cursor(cursor, self.model, self.keyset_columns)
+        return None
 
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(zip_save_path)
-                zip_files = glob.glob('*.zip')
-                for _zip in zip_files:
-                    os.unlink(_zip)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
-        os.chdir(APP_ROOT)
-        user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-        xls_save_path = target_save_path_xls + user_folder
-        zip_save_path = target_save_path_zip + user_folder
+    def _apply_sorting(self, query, joins, sort_column, sort_desc):
+        """
+        In keyset mode, default sort is on key columns and rows after cursor are selected
+        """
+        if self.keyset_columns and sort_column is None:
+            values = self._get_seek_key()
+            if values is not None:
+                query = query.filter(seek_filter(self.model, self.keyset_columns, values))
+            return query.order_by(*[getattr(self.model, column).desc() for column in self.keyset_columns]), joins
+        return super(StandardTaskView, self)._apply_sorting(query, joins, sort_column, sort_desc)
 
-        try:
-            if not os.path.exists(xls_save_path):
-                os.makedirs(xls_save_path)
-            if not os.path.exists(zip_save_path):
-                os.makedirs(zip_save_path)
-        except Exception as e:
-            flash('Failed to create/locate XLS/ZIP saving path. ' + str(e))
+    def _apply_pagination(self, query, page, page_size):
+        """
+        No OFFSET when page is fetched after cursor
+        """
+        if self._get_seek_key() is not None:
+            page = None
+        return super(StandardTaskView, self)._apply_pagination(query, page, page_size)
+
+    def keyset_url(self, pager_url, page, model=None):
+        """
+        URL of page, cursor of given model is added for seeking
+        :param pager_url: pager_url of list template
+        :param page: page number to be shown
+        :param model: last row of current page
+        """
+        url = pager_url(page)
+        if model is not None:
+            url = add_cursor(url, encode_cursor(model, self.keyset_columns))
+        return url
 
+    def after_model_change(self, form, model, is_created):
+        """
+        Updates latest task and daily summary of task's developer, and of its previous developer if it was moved
+        :param form:
+        :param model:
+        :param is_created:
+        """
+        super(StandardTaskView, self).after_model_change(form, model, is_created)
+        keys = [key for key in [(model.tm_added_on, model.tm_developer),
+                                getattr(model, '_previous_summary_key', None)] if key]
+        self._refresh_derived(list(set(developer for _, developer in keys if developer is not None)), keys)
+
+    def after_model_delete(self, model):
+        """
+        If task is deleted then update developer's latest task
+        :param model:
+        """
+        super(StandardTaskView, self).after_model_delete(model)
+        self._refresh_derived([model.tm_developer], [(model.tm_added_on, model.tm_developer)])
+
+    def _invalidate_exports(self, model):
+        """
+        Drops cached exports of task's day, and of its previous day if it was moved
+        """
+        export_cache.invalidate(model.tm_added_on)
+        previous = getattr(model, '_previous_summary_key', None)
+        if previous and previous[0] != model.tm_added_on:
+            export_cache.invalidate(previous[0])
+
+    def _refresh_derived(self, developers, summary_keys):
+        """
+        Updates latest task of developers and daily summary from their remaining tasks
+        :param developers: ids of developers
+        :param summary_keys: (tm_added_on, tm_developer) of changed tasks
+        """
         try:
-            all_tasks = Tasks.query.filter(Tasks.id.in_(ids))
-            tasks_per_day = sorted(set([task.tm_added_on for task in all_tasks.all()]))
-            for day in tasks_per_day:
-                tasks_of_day = all_tasks.filter_by(tm_added_on=day).all()
-                filename = generate_xls(tasks=tasks_of_day, action=0, folder=user_folder)
-            if len(tasks_per_day) > 1:
-                z_name = current_user.erp_user_name.replace(" ", "_") + str(
-                    '_{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
+            refresh_latest_task(developers)
+            refresh_daily_summary(summary_keys)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            flash('Error in updating latest task and summary of developer')
 
-                download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                filename = APP_ROOT + "/" + download_file
+    @action('export_date', 'Generate XLS [date-wise]', 'Are you sure you want to generate XLS for selected tasks?')
+    def action_export_date_wise(self, ids):
+        """
+        date-wise action 0
+        :param ids:
+        """
+        try:
+            all_tasks = load_tasks(Tasks.query.filter(Tasks.id.in_(ids)))
+            z_name = current_user.erp_user_name.replace(" ", "_") + str(
+                '_{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
 
-            return send_file(filename_or_fp=filename, as_attachment=True,
-                             attachment_filename=filename.split("/")[-1])
+            return send_export(bundle(date_wise(all_tasks, workbook_format('export_date')), zip_name=z_name))
 
         except Exception as ex:
             if not self.handle_view_exception(ex):
@@ -1123,54 +1048,12 @@ class StandardTaskView(StandardModelView):
         project-wise action 2
         :param ids:
         """
-
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(zip_save_path)
-                zip_files = glob.glob('*.zip')
-                for _zip in zip_files:
-                    os.unlink(_zip)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
-        os.chdir(APP_ROOT)
-        user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-        xls_save_path = target_save_path_xls + user_folder
-        zip_save_path = target_save_path_zip + user_folder
-
         try:
-            if not os.path.exists(xls_save_path):
-                os.makedirs(xls_save_path)
-            if not os.path.exists(zip_save_path):
-                os.makedirs(zip_save_path)
-        except Exception as e:
-            flash('Failed to create/locate XLS/ZIP saving path. ' + str(e))
+            all_tasks = load_tasks(Tasks.query.filter(Tasks.id.in_(ids)))
+            z_name = "Tasks_ProjectWise_of_" + str(
+                '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
 
-        try:
-            all_tasks = Tasks.query.filter(Tasks.id.in_(ids))
-            tasks_by_project = sorted(set([task.tm_task_project_id for task in all_tasks.all()]))
-            for project in tasks_by_project:
-                tasks_of_project = all_tasks.filter_by(tm_task_project_id=project).all()
-                filename = generate_xls(tasks_of_project, action=2, folder=user_folder)
-            if len(tasks_by_project) > 1:
-                z_name = "/Tasks_ProjectWise_of_" + str(
-                    '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
-                download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                filename = APP_ROOT + "/" + download_file
-
-            return send_file(filename_or_fp=filename, as_attachment=True,
-                             attachment_filename=filename.split("/")[-1])
+            return send_export(bundle(project_wise(all_tasks, workbook_format('export_project')), zip_name=z_name))
 
         except Exception as ex:
             if not self.handle_view_exception(ex):
@@ -1185,38 +1068,10 @@ class StandardTaskView(StandardModelView):
         merged action 3
         :param ids:
         """
-
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
-        os.chdir(APP_ROOT)
-        user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-        xls_save_path = target_save_path_xls + user_folder
-        try:
-            if not os.path.exists(xls_save_path):
-                os.makedirs(xls_save_path)
-        except Exception as e:
-            flash('Failed to delete XLS/ZIP. ' + str(e))
-
         try:
-            all_tasks = Tasks.query.filter(Tasks.id.in_(ids))
-            filename = generate_xls(tasks=all_tasks, action=3, folder=user_folder)
+            all_tasks = load_tasks(Tasks.query.filter(Tasks.id.in_(ids)))
 
-            return send_file(filename_or_fp=filename, as_attachment=True,
-                             attachment_filename=filename.split("/")[-1])
+            return send_export(merged(all_tasks, workbook_format('export_merge')))
         except Exception as ex:
             if not self.handle_view_exception(ex):
                 raise
@@ -1224,17 +1079,11 @@ class StandardTaskView(StandardModelView):
             flash('Failed to add tasks to XLS. ' + str(ex))
 
 
-def get_hour_minute(tm_estimated_hours):
+def _not_of_inactive_developer():
     """
-    Returns separated hours and minute from '08:00:00'
-    :param tm_estimated_hours:
-    :return:
+    Filter excluding tasks of deactivated developers, a correlated NOT EXISTS on users' primary key
     """
-    if tm_estimated_hours.split(':')[0] and tm_estimated_hours.split(':')[1]:
-        return tm_estimated_hours.split(':')[0], tm_estimated_hours.split(':')[1]
-    else:
-        flash('Estimated hours is not set properly, so default time is set to 08:00, please check')
-        return '08', '00'
+    return ~Tasks.relative_developer.has(Users.tm_user_status == False)
 
 
 class AdminTaskView(StandardTaskView):
@@ -1246,6 +1095,13 @@ class AdminTaskView(StandardTaskView):
 
     column_searchable_list = (Users.id, Users.erp_user_name, Projects.erp_project_id, Qa.erp_user_name)
 
+    column_select_related_list = ('relative_project', 'relative_milestone', 'relative_qa', 'relative_developer')
+
+    keyset_columns = ('id',)
+
+    # counting whole tasks table costs more than a page, highest id is used as approximate count instead
+    estimated_count = app.config['ESTIMATED_TASK_COUNT']
+
     column_list = (
         Tasks.tm_added_on, 'relative_project', Tasks.tm_task_title, 'relative_milestone',
         Tasks.tm_start_date, Tasks.tm_end_date, Tasks.tm_estimated_hours, 'relative_qa',
@@ -1320,98 +1176,33 @@ class AdminTaskView(StandardTaskView):
         'relative_developer': _developer_formatter,
     }
 
-    def add_to_erp(self, task_details, project_id):
-        """
-        Connects to ERP, and submits task
-        :param project_id:
-        :param task_details:
-        :return:
-        """
-        cookies = cookielib.CookieJar()
-        opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(cookies))
-
-        # Login to ERP using login_info
-        login_erp = opener.open(URL_ERP_LOGIN, urllib.urlencode(LOGIN_INFO))
-
-        add_task_to_erp = opener.open(URL_ADD_TASK + '/' + project_id, urllib.urlencode(task_details))
-
-        logout_erp = opener.open(URL_ERP_LOGOUT)
-
-        if add_task_to_erp.url == URL_ERP_LOGIN:
-            return False
-        else:
-            # if success
-            return True
-
     @action('approve', 'Add to ERP', 'Are you sure you want to approve selected users?')
     def action_approve(self, ids):
         """
-        Adding add to ERP action
+        Adding add to ERP action, tasks are queued and submitted by ERP worker
         :param ids:
         """
         try:
-            query = Tasks.query.filter(Tasks.id.in_(ids))
-            count = 0
-            for task in query.all():
-                if not task.erp_task_status:
-                    # add api call for adding task to ERP
-                    t_type = 1
-                    t_priority = 1
-                    t_status = 1
-                    t_qa = None
-                    if task.tm_type == 'Bug':
-                        t_type = 0
-                    if task.tm_priority == "Low":
-                        t_priority = 0
-                    if task.relative_qa:
-                        t_qa = task.relative_qa.erp_user_id
-                    hour, minute = get_hour_minute(task.tm_estimated_hours)
-                    estimated_hour_key = 'Tasks[task_estimated_hours][' + \
-                                         str((datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) -
-                                              datetime(1970, 1, 1)).total_seconds()) + ']'
-                    task_details = {
-                        'Tasks[task_title]': task.tm_task_title,
-                        'Tasks[task_type]': t_type,
-                        'Tasks[task_priority]': t_priority,
-                        'Tasks[start_date]': '{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(task.tm_start_date),
-                        'Tasks[end_date]': '{0.day:02d}-{0.month:02d}-{0.year:4d}'.format(task.tm_end_date),
-                        'hour': hour,
-                        'minute': minute,
-                        estimated_hour_key: hour + ':' + minute,
-                        'Tasks[quality_assurer_id]': t_qa,
-                        'Tasks[status]:': t_status,
-                        'Tasks[delay_reason]': '',
-                        'Tasks[project_id]': task.relative_project.erp_project_id,
-                        'Tasks[milestone_id]': task.relative_milestone.erp_milestone_id,
-                        'Tasks[developer_id]': task.relative_developer.erp_user_id,
-                        'Tasks[task_description]': task.tm_description
-                    }
-                    project_id = str(task.relative_project.erp_project_id)
-                    submitted = self.add_to_erp(task_details, project_id)
-                    if submitted:
-                        task.erp_task_status = True
-                        db.session.commit()
-                        count += 1
-                    else:
-                        return redirect(URL_ERP_LOGIN)
+            count = enqueue_tasks(ids)
+            count_cache.invalidate()
 
             if count:
                 if len(ids) == count:
                     if count == 1:
-                        flash('Selected task is successfully added to ERP.')
+                        flash('Selected task is queued for ERP.')
                     else:
-                        flash('All selected tasks are successfully added to ERP.')
+                        flash('All selected tasks are queued for ERP.')
                 else:
-                    flash('New submitted tasks : ' + str(count) + ' AND Already submitted tasks : ' + str(
+                    flash('Newly queued tasks : ' + str(count) + ' AND Already submitted/queued tasks : ' + str(
                         len(ids) - count))
             else:
-                flash('All tasks are already submitted.')
+                flash('All tasks are already submitted or queued.')
 
         except Exception as ex:
             if not self.handle_view_exception(ex):
                 raise
 
-            flash('Failed to add tasks to ERP. ' + str(ex))
+            flash('Failed to queue tasks for ERP. ' + str(ex))
 
     @action('export_dev', 'Generate XLS [developer-wise]', 'Are you sure you want to generate XLS for selected tasks?')
     def action_export_developer_wise(self, ids):
@@ -1419,59 +1210,12 @@ class AdminTaskView(StandardTaskView):
         developer-wise action 1
         :param ids:
         """
-
-        @after_this_request
-        def delete(response):
-            """
-            Removes xls and zip file after download
-            """
-            try:
-                os.chdir(xls_save_path)
-                xls_files = glob.glob('*.xls')
-                for xls in xls_files:
-                    os.unlink(xls)
-                os.chdir(zip_save_path)
-                zip_files = glob.glob('*.zip')
-                for _zip in zip_files:
-                    os.unlink(_zip)
-                os.chdir(APP_ROOT)
-            except Exception as exception:
-                os.chdir(APP_ROOT)
-                flash('Failed to delete XLS/ZIP. ' + str(exception))
-            return response
-
-        os.chdir(APP_ROOT)
-        user_folder = str(current_user.id) + '_' + current_user.erp_user_name
-        xls_save_path = target_save_path_xls + user_folder
-        zip_save_path = target_save_path_zip + user_folder
-
         try:
-            if not os.path.exists(xls_save_path):
-                os.makedirs(xls_save_path)
-            if not os.path.exists(zip_save_path):
-                os.makedirs(zip_save_path)
-        except Exception as e:
-            flash('Failed to create/locate XLS/ZIP saving path. ' + str(e))
+            all_tasks = load_tasks(Tasks.query.filter(Tasks.id.in_(ids)))
+            z_name = "Tasks_DeveloperWise_of_" + str(
+                '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
 
-        try:
-            all_tasks = Tasks.query.filter(Tasks.id.in_(ids))
-            tasks_by_dev = sorted(set([task.tm_developer for task in all_tasks.all()]))
-            for dev in tasks_by_dev:
-                project_of_dev = sorted(
-                    set([task.tm_task_project_id for task in all_tasks.filter_by(tm_developer=dev).all()]))
-                for project in project_of_dev:
-                    project_id = Projects.query.get(project)
-                    tasks_of_dev = all_tasks.filter_by(tm_developer=dev, tm_task_project_id=project).all()
-                    filename = generate_xls(tasks=tasks_of_dev, action=1, folder=user_folder,
-                                            project=project_id.erp_project_id)
-            if len(tasks_by_dev) > 1:
-                z_name = "/Tasks_DeveloperWise_of_" + str(
-                    '{0.day:02d}_{0.month:02d}_{0.year:4d}'.format(datetime.now().date()))
-                download_file = generate_zip(zip_name=z_name, user_folder=user_folder)
-                filename = APP_ROOT + "/" + download_file
-
-            return send_file(filename_or_fp=filename, as_attachment=True,
-                             attachment_filename=filename.split("/")[-1])
+            return send_export(bundle(developer_wise(all_tasks, workbook_format('export_dev')), zip_name=z_name))
 
         except Exception as ex:
             if not self.handle_view_exception(ex):
@@ -1484,27 +1228,87 @@ class AdminTaskView(StandardTaskView):
         Accessibility of the view
         :return:
         """
-        if current_user.is_authenticated:
-            if current_user.tm_user_role == ADMIN:
-                return current_user.is_authenticated
-        return False
+        return is_admin()
 
     def get_query(self):
         """
         Custom query to get only active user's tasks
         :return:
         """
-        inactive_users = [user.id for user in Users.query.filter_by(tm_user_status=False).all()]
-        return self.session.query(self.model).select_from(Tasks).filter(self.model.tm_developer.notin_(inactive_users))
+        return self.session.query(self.model).select_from(Tasks).filter(_not_of_inactive_developer())
 
+    @cached_count
     def get_count_query(self):
         """
-        Count of custom query result
+        Count of custom query result, estimated from highest task id when nothing is searched/filtered
+        :return:
+        """
+        if self.estimated_count:
+            view_args = self._get_list_extra_args()
+            if not view_args.search and not view_args.filters:
+                return self.session.query(func.coalesce(func.max(Tasks.id), 0))
+        return self.session.query(func.count('*')).select_from(Tasks).filter(_not_of_inactive_developer())
+
+
+class AdminErpJobView(StandardModelView):
+    """
+    Progress of tasks queued for ERP
+    """
+    can_create = False
+    can_edit = False
+    can_delete = True
+
+    column_list = ('relative_task', 'tm_job_status', 'tm_attempts', 'tm_last_error', 'tm_queued_on', 'tm_updated_on')
+
+    column_labels = dict(relative_task='Task', tm_job_status='Status', tm_attempts='Attempts',
+                         tm_last_error='Last Error', tm_queued_on='Queued On', tm_updated_on='Updated On')
+
+    column_descriptions = dict(relative_task='Task queued for ERP',
+                               tm_job_status='queued/running/done/failed',
+                               tm_attempts='Number of times task is sent to ERP',
+                               tm_last_error='Error of last failed attempt')
+
+    column_default_sort = ('id', True)
+
+    column_sortable_list = ('tm_job_status', 'tm_attempts', 'tm_queued_on', 'tm_updated_on')
+
+    column_filters = ('tm_job_status', 'tm_queued_on')
+
+    column_select_related_list = ('relative_task',)
+
+    def _task_formatter(view, context, model, name):
+        """
+        Returns task title in span tag with title as task id
+        """
+        markupstring = "<span title='%s'> %s </span>" % (model.tm_task_id, model.relative_task.tm_task_title)
+        return Markup(markupstring)
+
+    column_formatters = {
+        'relative_task': _task_formatter,
+    }
+
+    @action('retry', 'Retry', 'Are you sure you want to retry selected failed tasks?')
+    def action_retry(self, ids):
+        """
+        Puts failed jobs back in queue
+        :param ids:
+        """
+        try:
+            count = requeue_jobs(ids)
+            count_cache.invalidate()
+            flash('Requeued tasks : ' + str(count))
+        except Exception as ex:
+            if not self.handle_view_exception(ex):
+                raise
+
+            flash('Failed to requeue tasks. ' + str(ex))
+
+    def is_accessible(self):
+        """
+        Accessibility of the view
         :return:
         """
-        inactive_users = [user.id for user in Users.query.filter_by(tm_user_status=False).all()]
-        return self.session.query(func.count('*')).select_from(Tasks).filter(
-            self.model.tm_developer.notin_(inactive_users))
+        return is_admin()
 
 
 def _get_milestone_list():
@@ -1558,45 +1362,7 @@ class StandardDeveloperTaskView(StandardTaskView):
         Accessibility of the view
         :return:
         """
-        if current_user.is_authenticated:
-            if current_user.tm_user_role == DEVELOPER:
-                return current_user.is_authenticated
-        return False
-
-    def after_model_change(self, form, model, is_created):
-        """
-        If task is created, then update latest task of developer
-        :param form:
-        :param model:
-        :param is_created:
-        """
-        try:
-            if is_created:
-                current_user.tm_latest_task = datetime.now().date()
-                db.session.commit()
-
-        except Exception as e:
-            db.session.rollback()
-            flash('Error in updating latest task of developer')
-
-    def after_model_delete(self, model):
-        """
-        If task is deleted then update developer's latest task
-        :param model:
-        :return:
-        """
-        try:
-            latest_task = Tasks.query.filter_by(tm_developer=model.tm_developer).first()
-            update_user_latest_task = Users.query.filter_by(id=model.tm_developer).first()
-            if latest_task:
-                latest_task = Tasks.query.filter_by(tm_developer=model.tm_developer).all()
-                update_user_latest_task.tm_latest_task = latest_task[-1].tm_added_on
-            else:
-                update_user_latest_task.tm_latest_task = None
-            db.session.commit()
-        except Exception as e:
-            db.session.rollback()
-            flash('Error in updating latest task of developer')
+        return is_developer()
 
     def on_model_delete(self, model):
         """
@@ -1625,6 +1391,7 @@ class DeveloperTaskView(StandardDeveloperTaskView):
         return self.session.query(self.model).filter(self.model.tm_developer == current_user.id).filter(
             self.model.tm_added_on == datetime.now().date())
 
+    @cached_count
     def get_count_query(self):
         """
         Count of custom query result
@@ -1639,6 +1406,8 @@ class DeveloperAllTaskView(StandardDeveloperTaskView):
     Developer's view for All tasks
     """
 
+    keyset_columns = ('tm_added_on', 'id')
+
     def get_query(self):
         """
         Custom query to get only current user's all tasks
@@ -1646,6 +1415,7 @@ class DeveloperAllTaskView(StandardDeveloperTaskView):
         """
         return self.session.query(self.model).filter(self.model.tm_developer == current_user.id)
 
+    @cached_count
     def get_count_query(self):
         """
         Count of custom query result
@@ -1736,6 +1506,91 @@ class ChangePasswordView(sqla.ModelView):
         return self.session.query(func.count('*')).filter(self.model.id == current_user.id)
 
 
+class ReportView(admin.BaseView):
+    """
+    Estimated hours report for admin, per developer, project and week
+    """
+
+    def _get_range(self):
+        """
+        Returns (start, end) dates from request, defaults to last four weeks
+        """
+        start = None
+        end = datetime.now().date()
+        try:
+            if request.args.get('end'):
+                end = datetime.strptime(request.args['end'], '%d-%m-%Y').date()
+            if request.args.get('start'):
+                start = datetime.strptime(request.args['start'], '%d-%m-%Y').date()
+        except ValueError:
+            flash('Invalid date!')
+        if start is None:
+            start = end - timedelta(days=end.weekday() + 21)
+        return start, end
+
+    @expose('/')
+    def index(self):
+        """
+        :return:
+        """
+        start, end = self._get_range()
+        return self.render('admin/reports.html', report=estimated_hours_report(start, end),
+                           start=_format_to_standard_date(start), end=_format_to_standard_date(end))
+
+    @expose('/api')
+    def api(self):
+        """
+        Same report as JSON
+        :return:
+        """
+        start, end = self._get_range()
+        return jsonify(success=True, **estimated_hours_report(start, end))
+
+    def is_accessible(self):
+        """
+        Accessibility of the view
+        :return:
+        """
+        return is_admin()
+
+
+class PerfView(admin.BaseView):
+    """
+    SQL profile of recent requests for admin
+    """
+
+    @expose('/')
+    def index(self):
+        """
+        :return:
+        """
+        return self.render('admin/perf.html', requests=sql_profiler.recent_requests(),
+                           statements=sql_profiler.top_statements())
+
+    @expose('/reset', methods=['POST'])
+    def reset(self):
+        """
+        Drops collected profiles
+        :return:
+        """
+        sql_profiler.reset()
+        return redirect(url_for('perf.index'))
+
+    def is_visible(self):
+        """
+        Shown in menu only when profiling is on
+        :return:
+        """
+        return bool(app.config.get('SQL_PROFILING'))
+
+    def is_accessible(self):
+        """
+        Accessibility of the view
+        :return:
+        """
+        return is_admin()
+
+
 # Create admin
 admin = admin.Admin(app, 'Task Manager', index_view=MainView(), base_template='layout.html',
                     template_mode='bootstrap3', url='/')
@@ -1746,6 +1601,9 @@ admin.add_view(AdminQAView(Qa, db.session, name="Quality Assurer", endpoint="all
 admin.add_view(AdminMilestoneView(Milestones, db.session, name="Milestones", endpoint="all_milestones"))
 admin.add_view(AdminProjectView(Projects, db.session, name="Projects", endpoint="all_projects"))
 admin.add_view(AdminTaskView(Tasks, db.session, name="Tasks", endpoint="all_tasks"))
+admin.add_view(AdminErpJobView(ErpJobs, db.session, name="ERP Queue", endpoint="erp_queue"))
+admin.add_view(ReportView(name="Reports", endpoint="reports"))
+admin.add_view(PerfView(name="Performance", endpoint="perf"))
 
 # developer views
 admin.add_view(DeveloperTaskView(Tasks, db.session, name="Today's Tasks", endpoint="today_tasks"))
@@ -1753,15 +1611,6 @@ admin.add_view(DeveloperAllTaskView(Tasks, db.session, name="All Tasks", endpoin
 admin.add_view(ChangePasswordView(Users, db.session, name="Profile", endpoint="profile"))
 
 
-def gen_dp_all():
-    """
-    Generates dp for all users
-    """
-    all_users = Users.query.all()
-    for u in all_users:
-        generate_dp(u.erp_user_name, u.id)
-
-
 def build_sample_db():
     """
     Drops old db, and creates new one
@@ -1775,16 +1624,100 @@ def build_sample_db():
                     tm_user_role="admin")
     db.session.add(tl_user)
     db.session.commit()
-    gen_dp_all()
 
 
-@app.cli.command('initdb')
-def initdb_command():
+@app.cli.command('init-db')
+def init_db_command():
     """Initializes the database."""
     build_sample_db()
     print('Initialized the database.')
 
 
+def upgrade_db():
+    """
+    Creates tables, columns and indexes declared on models which are not yet present in existing database,
+    a created daily summary is filled from existing tasks
+    :return: names of created tables, columns and indexes
+    """
+    inspector = inspect(db.engine)
+    table_names = inspector.get_table_names()
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in table_names:
+            table.create(bind=db.engine)
+            created.append(table.name)
+            continue
+        columns = set(column['name'] for column in inspector.get_columns(table.name))
+        for column in table.columns:
+            if column.name not in columns:
+                # added columns are nullable, rows already present get NULL
+                db.engine.execute('ALTER TABLE %s ADD COLUMN %s' % (
+                    table.name, CreateColumn(column).compile(dialect=db.engine.dialect)))
+                created.append(table.name + '.' + column.name)
+        existing = set(index['name'] for index in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    if DailyTaskSummary.__tablename__ in created:
+        rebuild_daily_summary()
+        db.session.commit()
+    return created
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Creates missing tables, columns and indexes on existing database."""
+    created = upgrade_db()
+    if created:
+        print('Created tables/columns/indexes: ' + ', '.join(created))
+    else:
+        print('Database is already up to date.')
+
+
+@app.cli.command('rebuild-latest-task')
+def rebuild_latest_task_command():
+    """Recomputes latest task of all users."""
+    count = refresh_latest_task()
+    db.session.commit()
+    print('Updated latest task of users: ' + str(count))
+
+
+@app.cli.command('rebuild-daily-summary')
+def rebuild_daily_summary_command():
+    """Recomputes daily task summary from all tasks."""
+    count = rebuild_daily_summary()
+    db.session.commit()
+    print('Summary rows: ' + str(count))
+
+
+@app.cli.command('rebuild-avatars')
+@click.option('--processes', default=None, type=int, help='Worker processes, defaults to number of CPUs.')
+@click.option('--force', is_flag=True, help='Render existing avatars again.')
+def rebuild_avatars_command(processes, force):
+    """Renders avatars of all users in parallel."""
+    usernames = [name for name, in db.session.query(Users.erp_user_name)]
+    start = time.time()
+    rendered, skipped = rebuild_avatars(usernames, processes=processes, force=force)
+    elapsed = time.time() - start
+    print('Rendered avatars: %d, skipped: %d, in %.2fs (%.1f avatars/s)' % (
+        rendered, skipped, elapsed, rendered / elapsed if elapsed else 0))
+
+
+@app.cli.command('erp-worker')
+@click.option('--burst', is_flag=True, help='Stop once queue is empty.')
+@click.option('--poll-interval', default=2, help='Seconds to wait when queue is empty.')
+@click.option('--max-attempts', default=3, help='Attempts per task before it is marked failed.')
+@click.option('--batch-size', default=50, help='Tasks submitted per ERP login.')
+@click.option('--concurrency', default=app.config['ERP_CONCURRENCY'], help='Tasks submitted to ERP at a time.')
+@click.option('--metrics-file', default=None, help='File where ERP timings are written after each batch.')
+def erp_worker_command(burst, poll_interval, max_attempts, batch_size, concurrency, metrics_file):
+    """Adds queued tasks to ERP."""
+    count = run_worker(app.config, poll_interval=poll_interval, max_attempts=max_attempts, batch_size=batch_size,
+                       concurrency=concurrency, burst=burst, metrics_file=metrics_file)
+    print('Tasks added to ERP: ' + str(count))
+
+
 if __name__ == '__main__':
     # Initialize flask-login
     init_login()
@@ -0,0 +1,216 @@
+# coding=utf-8
+"""
+In-process metrics served in Prometheus text format, request latency, counts, sizes and in-flight requests
+per endpoint, and timings of XLS/ZIP generation and ERP calls
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, g, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+_registry = []
+
+
+def _format_labels(label_names, labels, extra=()):
+    """
+    Returns labels in Prometheus text format e.g. {endpoint="login",method="GET"}
+    """
+    pairs = list(zip(label_names, labels)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in pairs)
+
+
+class Metric(object):
+    """
+    Base of metrics, values are kept per tuple of label values
+    """
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def samples(self):
+        """
+        Returns lines of metric values
+        """
+        with self._lock:
+            return ['%s%s %s' % (self.name, _format_labels(self.label_names, labels), repr(float(value)))
+                    for labels, value in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    """
+    Value which only goes up
+    """
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    """
+    Value which goes up and down
+    """
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    """
+    Counts of observed values by upper bounds of buckets, with their sum
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        lines = []
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append('%s_bucket%s %d' % (self.name, _format_labels(self.label_names, labels,
+                                                                                 [('le', repr(float(bound)))]),
+                                                     cumulative))
+                lines.append('%s_bucket%s %d' % (self.name, _format_labels(self.label_names, labels,
+                                                                             [('le', '+Inf')]), count))
+                lines.append('%s_sum%s %s' % (self.name, _format_labels(self.label_names, labels), repr(total)))
+                lines.append('%s_count%s %d' % (self.name, _format_labels(self.label_names, labels), count))
+        return lines
+
+
+REQUEST_LATENCY = Histogram('task_manager_request_duration_seconds', 'Time taken to build response',
+                            ('endpoint', 'method'))
+REQUESTS = Counter('task_manager_requests_total', 'Requests handled', ('endpoint', 'method', 'status'))
+RESPONSE_SIZE = Histogram('task_manager_response_size_bytes', 'Size of response body', ('endpoint',),
+                          buckets=SIZE_BUCKETS)
+IN_FLIGHT = Gauge('task_manager_requests_in_flight', 'Requests being handled', ('endpoint',))
+OPERATION_LATENCY = Histogram('task_manager_operation_duration_seconds',
+                              'Time taken by XLS/ZIP generation and ERP calls', ('operation',))
+
+
+@contextmanager
+def timer(operation):
+    """
+    Observes time taken by block in OPERATION_LATENCY
+    :param operation: e.g. 'xls', 'zip', 'erp_add_task'
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        OPERATION_LATENCY.observe(time.time() - start, (operation,))
+
+
+def timed(operation):
+    """
+    Decorator observing time taken by function in OPERATION_LATENCY
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render():
+    """
+    Returns all metrics in Prometheus text format
+    """
+    lines = []
+    for metric in _registry:
+        lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+        lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def write(path):
+    """
+    Writes metrics to file, for processes without HTTP server e.g. ERP worker
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as metrics_file:
+        metrics_file.write(render())
+    # renamed so a collector reading the file never sees it half written
+    os.rename(temp_path, path)
+
+
+def _start_request():
+    g.metrics_endpoint = request.endpoint or 'unknown'
+    g.metrics_start = time.time()
+    IN_FLIGHT.inc((g.metrics_endpoint,))
+
+
+def _finish_request(response):
+    endpoint = g.get('metrics_endpoint')
+    if endpoint is None:
+        return response
+    REQUEST_LATENCY.observe(time.time() - g.metrics_start, (endpoint, request.method))
+    REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, (endpoint,))
+    return response
+
+
+def _teardown_request(exc):
+    endpoint = g.get('metrics_endpoint')
+    if endpoint is not None:
+        IN_FLIGHT.dec((endpoint,))
+        if exc is not None:
+            REQUESTS.inc((endpoint, request.method, '500'))
+
+
+def init_app(app):
+    """
+    Records metrics of requests of app and serves them on /metrics, turned off by METRICS = False
+    """
+    if not app.config.get('METRICS', True):
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route('/metrics')
+    def metrics():
+        """
+        Metrics in Prometheus text format
+        """
+        return Response(render(), mimetype='text/plain; version=0.0.4')
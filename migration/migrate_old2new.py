@@ -1,33 +1,25 @@
 # coding=utf-8
 """
 Migrating from old database to new database
+To migrate,
+    python migrate_old2new.py [--chunk-size 5000] [--resume]
 """
+import argparse
+import os
+import sys
+from collections import defaultdict
 from datetime import datetime
+from itertools import count
 
+from sqlalchemy import Integer, cast
 from werkzeug.security import generate_password_hash
 
-from models import Milestones, Projects, Qa, Tasks, Users, db as new_db
-from models_old import Details, User
+from models import Milestones, Projects, Qa, Tasks, Users, db as new_db, project_developer, project_qa
+from models_old import Details, User, db as old_db
 
-
-def add_modify_project_api(project_obj, developers, qas):
-    """
-    Updates project
-    :param project_obj:
-    :param developers:
-    :param qas:
-    """
-    project_obj.tm_developer_id[:] = []
-    project_obj.tm_quality_assurer_id[:] = []
-
-    for dev_id in developers:
-        developer_obj = Users.query.filter_by(erp_user_id=dev_id).first()
-        project_obj.tm_developer_id.append(developer_obj)
-    for qa_id in qas:
-        qa_obj = Qa.query.filter_by(erp_user_id=qa_id).first()
-        project_obj.tm_quality_assurer_id.append(qa_obj)
-
-    new_db.session.commit()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'migration_common'))
+from durations import DurationParser  # noqa: E402
+from engine import last_id, migrate  # noqa: E402
 
 
 def reset_new_db():
@@ -38,153 +30,164 @@ def reset_new_db():
     new_db.create_all()
 
 
-def populate_developers():
+def populate_developers(chunk_size):
     """
-    Converts users table to new schema
-    :return:
+    Converts users table to new schema, users repeating an email or with malformed role/latest task are skipped
     """
-    old_users = User.query.order_by(User.role.asc(), User.username.asc()).all()
-    erp_user_id = 100
-    for user in old_users:
-        erp_user_id = erp_user_id + 1
-        try:
-            new_developer = Users()
-            new_developer.tm_email_id = user.email
-            new_developer.tm_password = generate_password_hash("Drc@1234", method='sha256')
-            new_developer.tm_user_role = user.role.lower()
-            new_developer.erp_user_id = erp_user_id
-            new_developer.erp_user_name = user.username
-            if not user.latest_task == "no":
-                new_developer.tm_latest_task = datetime.strptime(user.latest_task, '%d/%m/%Y').date()
-            new_db.session.add(new_developer)
-            new_db.session.commit()
-        except Exception as e:
-            new_db.session.rollback()
-    return Users.query.count()
-
-
-def populate_qa():
-    """
-    Converts users table to new schema
-    :return:
-    """
-    old_qas = sorted(set([str(task.qa) for task in Details.query.order_by(Details.qa.asc()).all()]))
-    if '' in old_qas:
-        old_qas.remove('')
-    erp_qa_id = 200
-    for qa in old_qas:
-        erp_qa_id = erp_qa_id + 1
-        try:
-            new_qa = Qa()
-            new_qa.erp_user_name = qa
-            new_qa.tm_email_id = str(qa.replace(" ", ".").lower()) + str(erp_qa_id) + \
-                                 '@drcsystems.com'
-            new_qa.erp_user_id = erp_qa_id
-
-            new_db.session.add(new_qa)
-            new_db.session.commit()
+    erp_user_ids = count(101)
+    emails = set()
 
-        except Exception as e:
-            new_db.session.rollback()
+    def convert(user):
+        erp_user_id = next(erp_user_ids)
+        if user.email in emails:
+            return None
+        try:
+            latest_task = None if user.latest_task == "no" else datetime.strptime(user.latest_task, '%d/%m/%Y').date()
+            role = user.role.lower()
+        except (AttributeError, TypeError, ValueError):
+            return None
+        emails.add(user.email)
+        return dict(tm_email_id=user.email, tm_password=generate_password_hash("Drc@1234", method='sha256'),
+                    tm_user_role=role, erp_user_id=erp_user_id, erp_user_name=user.username,
+                    tm_latest_task=latest_task)
 
-    return Qa.query.count()
+    query = User.query.order_by(User.role.asc(), User.username.asc())
+    return migrate('Users', query, convert, new_db.session, Users.__table__, chunk_size)
 
 
-def populate_milestones():
+def populate_qa(chunk_size):
     """
-    Populates Milestones
+    Adds a QA for each distinct qa name of old tasks
     """
-    project_miles = sorted(set([(str(task.milestone), int(task.project_id)) for task in
-                                Details.query.order_by(Details.milestone.asc()).all()]))
-    mile_id = 300
-    for mile in project_miles:
-        mile_id += 1
-
-        new_milestone = Milestones()
-        new_milestone.erp_milestone_id = mile_id
-        new_milestone.tm_milestone_name = mile[0]
-        new_milestone.tm_milestone_project_id = mile[1]
+    erp_qa_ids = count(201)
 
-        new_db.session.add(new_milestone)
-        new_db.session.commit()
+    def convert(row):
+        qa = str(row.qa)
+        erp_qa_id = next(erp_qa_ids)
+        return dict(erp_user_name=qa, tm_email_id=qa.replace(" ", ".").lower() + str(erp_qa_id) + '@drcsystems.com',
+                    erp_user_id=erp_qa_id)
 
-    return Milestones.query.count()
+    query = old_db.session.query(Details.qa).filter(Details.qa != '').distinct().order_by(Details.qa.asc())
+    return migrate('Qas', query, convert, new_db.session, Qa.__table__, chunk_size)
 
 
-def populate_projects():
+def populate_milestones(chunk_size):
     """
-    Populates projects model
+    Adds a milestone for each distinct milestone name and project of old tasks, keeping ERP id of project
     """
-    project_ids = sorted(set([int(task.project_id) for task in Details.query.order_by(Details.project_id.asc()).all()]))
-    dummy_project_id = 0
-
-    for project_id in project_ids:
-        dummy_project_id = dummy_project_id + 1
-
-        developers = sorted(set([str(task.developer) for task in Details.query.filter_by(project_id=project_id).all()]))
-        developer_ids = []
-        for developer in developers:
-            user = Users.query.filter_by(erp_user_name=developer).first()
-            if user:
-                developer_ids.append(user.erp_user_id)
-        qas = sorted(set([str(task.qa) for task in Details.query.filter_by(project_id=project_id).all()]))
-        if '' in qas:
-            qas.remove('')
-        if len(qas) > 0:
-            qas_id = [Qa.query.filter_by(erp_user_name=qa).first().erp_user_id for qa in qas]
-        else:
-            qas_id = []
-
-        new_object = Projects()
-        new_object.tm_project_name = "Project " + str(dummy_project_id)
-        new_object.erp_project_id = int(project_id)
+    erp_milestone_ids = count(301)
+    project_id = cast(Details.project_id, Integer)
 
-        new_db.session.add(new_object)
-        new_db.session.commit()
+    def convert(row):
+        return dict(erp_milestone_id=next(erp_milestone_ids), tm_milestone_name=str(row[0]),
+                    tm_milestone_project_id=row[1])
 
-        add_modify_project_api(new_object, developers=developer_ids, qas=qas_id)
+    query = old_db.session.query(Details.milestone, project_id).filter(Details.milestone.isnot(None)).distinct()
+    query = query.order_by(Details.milestone.asc(), project_id.asc())
+    return migrate('Milestones', query, convert, new_db.session, Milestones.__table__, chunk_size)
 
-    return Projects.query.count()
 
-
-def populate_tasks():
+def populate_projects(chunk_size):
+    """
+    Adds a project for each distinct project id of old tasks, along with developers and qas of its tasks
+    in same transaction, members are read from old tasks once instead of per project
+    """
+    project_id = cast(Details.project_id, Integer)
+    # first user/qa of a name wins, as .first() did
+    developer_ids = dict(new_db.session.query(Users.erp_user_name, Users.id).order_by(Users.id.desc()))
+    qa_ids = dict(new_db.session.query(Qa.erp_user_name, Qa.id).order_by(Qa.id.desc()))
+    developers = defaultdict(set)
+    for erp_project_id, developer in old_db.session.query(project_id, Details.developer).distinct():
+        if str(developer) in developer_ids:
+            developers[erp_project_id].add(developer_ids[str(developer)])
+    qas = defaultdict(set)
+    for erp_project_id, qa in old_db.session.query(project_id, Details.qa).filter(Details.qa != '').distinct():
+        if str(qa) in qa_ids:
+            qas[erp_project_id].add(qa_ids[str(qa)])
+    # new database is empty, so projects get ids 1, 2, ... in order of ERP id
+    new_ids = count(1)
+    project_ids = {}
+
+    def convert(row):
+        project_ids[row[0]] = new_id = next(new_ids)
+        return dict(id=new_id, tm_project_name="Project " + str(new_id), erp_project_id=row[0])
+
+    def add_members(rows):
+        members = [dict(tm_project_id=project_ids[erp_project_id], tm_developer_id=developer_id)
+                   for erp_project_id, in rows for developer_id in developers[erp_project_id]]
+        quality_assurers = [dict(tm_project_id=project_ids[erp_project_id], tm_quality_assurer_id=qa_id)
+                            for erp_project_id, in rows for qa_id in qas[erp_project_id]]
+        if members:
+            new_db.session.execute(project_developer.insert(), members)
+        if quality_assurers:
+            new_db.session.execute(project_qa.insert(), quality_assurers)
+
+    query = old_db.session.query(project_id).distinct().order_by(project_id.asc())
+    return migrate('Projects', query, convert, new_db.session, Projects.__table__, chunk_size,
+                   after_chunk=add_members)
+
+
+def populate_tasks(chunk_size, hours_parser):
+    """
+    Populates tasks model, ids of Details are kept, tasks of unknown developers are skipped
+    :param hours_parser: DurationParser recording tasks whose estimated hours fell back to default
+    """
+    project_ids = dict(new_db.session.query(Projects.erp_project_id, Projects.id))
+    milestone_ids = dict(((name, project_id), milestone_id) for name, project_id, milestone_id in
+                         new_db.session.query(Milestones.tm_milestone_name, Milestones.tm_milestone_project_id,
+                                              Milestones.id))
+    developer_ids = dict(new_db.session.query(Users.erp_user_name, Users.id))
+    qa_ids = dict(new_db.session.query(Qa.erp_user_name, Qa.id))
+
+    def convert(task):
+        developer_id = developer_ids.get(task.developer)
+        if not developer_id:
+            return None
+        return dict(id=task.id,
+                    tm_task_project_id=project_ids.get(int(task.project_id)),
+                    tm_task_title=task.task_title,
+                    tm_milestone=milestone_ids.get((task.milestone, int(task.project_id))),
+                    tm_start_date=datetime.strptime(task.start_date, '%d/%m/%Y').date(),
+                    tm_end_date=datetime.strptime(task.end_date, '%d/%m/%Y').date(),
+                    tm_estimated_hours=hours_parser.parse(task.estimated_hours, task.id),
+                    tm_qa=qa_ids.get(task.qa) if task.qa else None,
+                    tm_developer=developer_id,
+                    tm_priority=task.priority.capitalize(),
+                    tm_type=task.type.capitalize(),
+                    tm_description=task.description,
+                    tm_added_on=datetime.strptime(task.added_on, '%d/%m/%Y').date(),
+                    erp_task_status=False)
+
+    query = Details.query.filter(Details.id > last_id(new_db.session, Tasks)).order_by(Details.id.asc())
+    return migrate('Tasks', query, convert, new_db.session, Tasks.__table__, chunk_size)
+
+
+def report_fallbacks(hours_parser, path='estimated_hours_fallbacks.txt'):
     """
-    Populates tasks model
+    Writes ids and values of tasks whose estimated hours were set to default
     """
-    all_tasks = Details.query.all()
-    for task in all_tasks:
-        project_id = Projects.query.filter_by(erp_project_id=task.project_id).first()
-        milestone_id = Milestones.query.filter_by(tm_milestone_name=task.milestone,
-                                                  tm_milestone_project_id=task.project_id).first()
-        developer_id = Users.query.filter_by(erp_user_name=task.developer).first()
-        qa_id = None
-        if task.qa:
-            qa_id = Qa.query.filter_by(erp_user_name=task.qa).first().id
-        if developer_id:
-            new_task = Tasks()
-            new_task.tm_task_project_id = project_id.id
-            new_task.tm_task_title = task.task_title
-            new_task.tm_milestone = milestone_id.id
-            new_task.tm_start_date = datetime.strptime(task.start_date, '%d/%m/%Y').date()
-            new_task.tm_end_date = datetime.strptime(task.end_date, '%d/%m/%Y').date()
-            new_task.tm_estimated_hours = task.estimated_hours
-            new_task.tm_qa = qa_id
-            new_task.tm_developer = developer_id.id
-            new_task.tm_priority = task.priority.capitalize()
-            new_task.tm_type = task.type.capitalize()
-            new_task.tm_description = task.description
-            new_task.tm_added_on = datetime.strptime(task.added_on, '%d/%m/%Y').date()
-            new_task.erp_task_status = False
-
-            new_db.session.add(new_task)
-            new_db.session.commit()
-
-    return Details.query.count()
-
-
-reset_new_db()
-total_users = populate_developers()
-total_qas = populate_qa()
-total_milestones = populate_milestones()
-total_projects = populate_projects()
-total_tasks = populate_tasks()
+    if not hours_parser.fallbacks:
+        return
+    with open(path, 'w') as report:
+        for task_id, value in hours_parser.fallbacks:
+            report.write('%s\t%r\n' % (task_id, value))
+    print "Estimated hours of %d tasks set to %s, listed in %s" % (len(hours_parser.fallbacks),
+                                                                   hours_parser.default, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrates old database to new database')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows inserted per transaction')
+    parser.add_argument('--resume', action='store_true', help='Continue interrupted migration of tasks')
+    args = parser.parse_args()
+
+    if not args.resume:
+        reset_new_db()
+        populate_developers(args.chunk_size)
+        populate_qa(args.chunk_size)
+        populate_milestones(args.chunk_size)
+        populate_projects(args.chunk_size)
+    hours_parser = DurationParser()
+    populate_tasks(args.chunk_size, hours_parser)
+    print "Total Tasks : " + str(Tasks.query.count())
+    report_fallbacks(hours_parser)
@@ -140,7 +140,8 @@ class Tasks(db.Model):
     tm_milestone = db.Column(db.Integer, ForeignKey("milestones.id"))
     tm_start_date = db.Column(custom_date, nullable=False)
     tm_end_date = db.Column(custom_date, nullable=False)
-    tm_estimated_hours = db.Column(db.String(50), nullable=False)
+    tm_estimated_hours = db.Column(db.Time, default=datetime.strptime("08:00:00", "%H:%M:%S").time(),
+                                   nullable=False)
     tm_qa = db.Column(db.Integer, ForeignKey("qa.id"))
     tm_developer = db.Column(db.Integer, ForeignKey("users.id"))
     tm_priority = db.Column(db.String(50), nullable=False)
@@ -0,0 +1,58 @@
+# coding=utf-8
+"""
+Parser of estimated hours strings of old database, e.g. '8', '08:00', '8:30:00'
+"""
+import re
+from datetime import time
+
+DEFAULT = time(8, 0)
+
+# H, H:M or H:M:S with values strptime accepts for %H, %M and %S, anything else falls back to DEFAULT
+_duration = re.compile(r'^(2[0-3]|[01]?\d)(?::([0-5]?\d)(?::([0-5]?\d))?)?\Z')
+
+
+class DurationParser(object):
+    """
+    Converts estimated hours strings to time, parsed strings are cached
+    and rows falling back to default are recorded in fallbacks as (key, value)
+    """
+
+    def __init__(self, default=DEFAULT):
+        self.default = default
+        self.fallbacks = []
+        self._cache = {}
+
+    def _parse(self, value):
+        match = _duration.match(value) if isinstance(value, basestring) else None
+        if not match:
+            return None
+        return time(*[int(part) for part in match.groups() if part is not None])
+
+    def parse(self, value, key=None):
+        """
+        Returns time of estimated hours string
+        :param value: estimated hours string
+        :param key: identifies row in fallbacks, e.g. id of task
+        """
+        try:
+            result = self._cache[value]
+        except KeyError:
+            result = self._cache[value] = self._parse(value)
+        except TypeError:
+            # unhashable value
+            result = None
+        if result is None:
+            self.fallbacks.append((key, value))
+            return self.default
+        return result
+
+    def parse_many(self, values, keys=None):
+        """
+        Returns list of times of estimated hours strings, each distinct string is parsed once
+        :param values: estimated hours strings
+        :param keys: keys of rows recorded in fallbacks, defaults to positions of values
+        """
+        values = list(values)
+        if keys is None:
+            keys = range(len(values))
+        return [self.parse(value, key) for value, key in zip(values, keys)]
@@ -0,0 +1,81 @@
+# coding=utf-8
+"""
+Batched migration helpers, old rows are streamed and new rows are bulk inserted chunk by chunk,
+each chunk is committed in a single transaction, so an interrupted migration can resume after last chunk
+"""
+import sys
+import time
+from itertools import islice
+
+from sqlalchemy import func
+
+
+def stream(query, chunk_size):
+    """
+    Yields rows of query as lists of chunk_size rows, without loading whole table
+    :param query: query of old database ordered by id
+    :param chunk_size:
+    """
+    rows = iter(query.yield_per(chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def last_id(session, model):
+    """
+    Returns highest id of model in new database, 0 if it is empty
+    """
+    return session.query(func.coalesce(func.max(model.id), 0)).scalar()
+
+
+class Progress(object):
+    """
+    Prints migrated rows and rows per second
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.start = time.time()
+
+    def update(self, count):
+        self.count += count
+        elapsed = time.time() - self.start
+        sys.stdout.write('\r%s : %d rows, %.0f rows/s' % (self.name, self.count, self.count / elapsed if elapsed else 0))
+        sys.stdout.flush()
+
+    def done(self):
+        self.update(0)
+        sys.stdout.write('\n')
+        return self.count
+
+
+def migrate(name, query, convert, session, table, chunk_size, after_chunk=None):
+    """
+    Converts rows of old query and bulk inserts them in table, one transaction per chunk
+    :param name: name shown in progress
+    :param query: query of old database ordered by id
+    :param convert: function returning dict of new row for an old row, None to skip the row
+    :param session: session of new database
+    :param table: table of new database
+    :param chunk_size: rows per transaction
+    :param after_chunk: function called with old rows of chunk, before commit
+    :return: number of inserted rows
+    """
+    progress = Progress(name)
+    for chunk in stream(query, chunk_size):
+        rows = [row for row in (convert(old) for old in chunk) if row is not None]
+        try:
+            if rows:
+                session.execute(table.insert(), rows)
+            if after_chunk:
+                after_chunk(chunk)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        progress.update(len(rows))
+    return progress.done()
@@ -1,12 +1,20 @@
 # coding=utf-8
 """
 Migrating from old database to new database
+To migrate,
+    python migrate_old2new.py [--chunk-size 5000] [--resume]
 """
-import re
-from datetime import datetime
+import argparse
+import os
+import sys
 
-from models import Milestones, Projects, Qa, Tasks, Users, db as new__db
-from models_old import Milestones as _Milestones, Projects as _Projects, Qa as _Qa, Tasks as _Tasks, Users as _Users
+from models import Milestones, Projects, Qa, Tasks, Users, db as new__db, project_developer, project_qa
+from models_old import Milestones as _Milestones, Projects as _Projects, Qa as _Qa, Tasks as _Tasks, \
+    Users as _Users, db as old__db, project_developer as _project_developer, project_qa as _project_qa
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'migration_common'))
+from durations import DurationParser  # noqa: E402
+from engine import last_id, migrate  # noqa: E402
 
 
 def reset_new_db():
@@ -17,106 +25,97 @@ def reset_new_db():
     new__db.create_all()
 
 
-def populate_developers():
+def _unique(*fields):
     """
-    Converts users table to new schema
-    :return:
+    Returns filter dropping rows whose given fields repeat values of an earlier row
     """
-    old_users = _Users.query.all()
-    for user in old_users:
-        try:
-            new_developer = Users()
-            new_developer.tm_email_id = user.tm_email_id
-            new_developer.tm_password = user.tm_password
-            new_developer.tm_user_role = user.tm_user_role
-            new_developer.erp_user_id = user.erp_user_id
-            new_developer.erp_user_name = user.erp_user_name
-            new_developer.tm_latest_task = user.tm_latest_task
-            new__db.session.add(new_developer)
-            new__db.session.commit()
-        except Exception as e:
-            import pdb
-            pdb.set_trace()
-            new__db.session.rollback()
+    seen = dict((field, set()) for field in fields)
 
-    return Users.query.count()
+    def is_unique(row):
+        if any(row[field] in seen[field] for field in fields):
+            return False
+        for field in fields:
+            seen[field].add(row[field])
+        return True
 
+    return is_unique
 
-def populate_qa():
+
+def populate_developers(chunk_size):
     """
     Converts users table to new schema
     :return:
     """
-    old_qas = _Qa.query.all()
-    for qa in old_qas:
-        try:
-            new_qa = Qa()
-            new_qa.erp_user_name = qa.erp_user_name
-            new_qa.tm_email_id = qa.tm_email_id
-            new_qa.erp_user_id = qa.erp_user_id
-
-            new__db.session.add(new_qa)
-            new__db.session.commit()
+    is_unique = _unique('erp_user_id', 'tm_email_id')
 
-        except Exception as e:
-            new__db.session.rollback()
+    def convert(user):
+        row = dict(id=user.id, tm_email_id=user.tm_email_id, tm_password=user.tm_password,
+                   tm_user_role=user.tm_user_role, erp_user_id=user.erp_user_id,
+                   erp_user_name=user.erp_user_name, tm_latest_task=user.tm_latest_task)
+        return row if is_unique(row) else None
 
-    return Qa.query.count()
+    query = _Users.query.filter(_Users.id > last_id(new__db.session, Users)).order_by(_Users.id.asc())
+    return migrate('Users', query, convert, new__db.session, Users.__table__, chunk_size)
 
 
-def populate_milestones():
+def populate_qa(chunk_size):
     """
-    Populates Milestones
+    Converts users table to new schema
+    :return:
     """
-    project_miles = _Milestones.query.all()
-    for mile in project_miles:
-        new_milestone = Milestones()
-        new_milestone.erp_milestone_id = mile.erp_milestone_id
-        new_milestone.tm_milestone_name = mile.tm_milestone_name
-        new_milestone.tm_milestone_project_id = mile.tm_milestone_project_id
+    is_unique = _unique('erp_user_id', 'tm_email_id')
 
-        new__db.session.add(new_milestone)
-        new__db.session.commit()
+    def convert(qa):
+        row = dict(id=qa.id, erp_user_name=qa.erp_user_name, tm_email_id=qa.tm_email_id, erp_user_id=qa.erp_user_id)
+        return row if is_unique(row) else None
 
-    return Milestones.query.count()
+    query = _Qa.query.filter(_Qa.id > last_id(new__db.session, Qa)).order_by(_Qa.id.asc())
+    return migrate('Qas', query, convert, new__db.session, Qa.__table__, chunk_size)
 
 
-def add_modify_project_api(project_obj, developers, qas):
+def populate_milestones(chunk_size):
     """
-    Updates project
-    :param project_obj:
-    :param developers:
-    :param qas:
+    Populates Milestones
     """
-    project_obj.tm_developer_id[:] = []
-    project_obj.tm_quality_assurer_id[:] = []
-    for dev in developers:
-        dev_obj = Users.query.filter_by(id=dev).first()
-        project_obj.tm_developer_id.append(dev_obj)
-    for qa in qas:
-        qa_obj = Qa.query.filter_by(id=qa).first()
-        project_obj.tm_quality_assurer_id.append(qa_obj)
 
-    new__db.session.commit()
+    def convert(mile):
+        return dict(id=mile.id, erp_milestone_id=mile.erp_milestone_id, tm_milestone_name=mile.tm_milestone_name,
+                    tm_milestone_project_id=mile.tm_milestone_project_id)
 
+    query = _Milestones.query.filter(_Milestones.id > last_id(new__db.session, Milestones)).order_by(
+        _Milestones.id.asc())
+    return migrate('Milestones', query, convert, new__db.session, Milestones.__table__, chunk_size)
 
-def populate_projects():
+
+def populate_projects(chunk_size):
     """
-    Populates projects model
+    Populates projects model, along with developers and qas of projects in same transaction
     """
-    old_projects = _Projects.query.all()
-    for project in old_projects:
-        new_project = Projects()
-        new_project.erp_project_id = project.erp_project_id
-        new_project.tm_project_name = project.tm_project_name
-        new_project.tm_project_status = project.tm_project_status
-        developers = [dev.id for dev in project.tm_developer_id]
-        qas = [qa.id for qa in project.tm_quality_assurer_id]
-        new__db.session.add(new_project)
-        new__db.session.commit()
-        add_modify_project_api(new_project, developers, qas)
+    developer_ids = set(user_id for user_id, in new__db.session.query(Users.id))
+    qa_ids = set(qa_id for qa_id, in new__db.session.query(Qa.id))
+
+    def convert(project):
+        return dict(id=project.id, erp_project_id=project.erp_project_id, tm_project_name=project.tm_project_name,
+                    tm_project_status=project.tm_project_status)
+
+    def add_members(projects):
+        project_ids = [project.id for project in projects]
+        developers = [dict(tm_project_id=project_id, tm_developer_id=developer_id)
+                      for project_id, developer_id in old__db.session.execute(
+                          _project_developer.select().where(_project_developer.c.tm_project_id.in_(project_ids)))
+                      if developer_id in developer_ids]
+        qas = [dict(tm_project_id=project_id, tm_quality_assurer_id=qa_id)
+               for project_id, qa_id in old__db.session.execute(
+                   _project_qa.select().where(_project_qa.c.tm_project_id.in_(project_ids)))
+               if qa_id in qa_ids]
+        if developers:
+            new__db.session.execute(project_developer.insert(), developers)
+        if qas:
+            new__db.session.execute(project_qa.insert(), qas)
 
-    return Projects.query.count()
+    query = _Projects.query.filter(_Projects.id > last_id(new__db.session, Projects)).order_by(_Projects.id.asc())
+    return migrate('Projects', query, convert, new__db.session, Projects.__table__, chunk_size,
+                   after_chunk=add_members)
 
 
 def hasNumbers(inputString):
@@ -128,59 +127,66 @@ def hasNumbers(inputString):
     return any(char.isdigit() for char in inputString)
 
 
-def populate_tasks():
-    """
-    Populates tasks model
-    """
-    all_tasks = _Tasks.query.all()
-    for task in all_tasks:
-        new_task = Tasks()
-        new_task.tm_task_project_id = task.tm_task_project_id
-        new_task.tm_task_title = task.tm_task_title
-        new_task.tm_milestone = task.tm_milestone
-        new_task.tm_start_date = task.tm_start_date
-        new_task.tm_end_date = task.tm_end_date
-        try:
-            format1 = re.compile("([0-9]+):([0-9]+):([0-9]+)")
-            format2 = re.compile("([0-9]+):([0-9]+)")
-            format3 = re.compile("([0-9]+)")
-            if format1.match(task.tm_estimated_hours):
-                new_task.tm_estimated_hours = datetime.strptime(task.tm_estimated_hours, "%H:%M:%S").time()
-            elif format2.match(task.tm_estimated_hours):
-                new_task.tm_estimated_hours = datetime.strptime(task.tm_estimated_hours, "%H:%M").time()
-            elif format3.match(task.tm_estimated_hours):
-                new_task.tm_estimated_hours = datetime.strptime(task.tm_estimated_hours, "%H").time()
-            else:
-                new_task.tm_estimated_hours = datetime.strptime("08:00:00", "%H:%M:%S").time()
-        except:
-            new_task.tm_estimated_hours = datetime.strptime("08:00:00", "%H:%M:%S").time()
-        new_task.tm_qa = task.tm_qa
-        new_task.tm_developer = task.tm_developer
-        new_task.tm_priority = task.tm_priority
-        new_task.tm_type = task.tm_type
-        new_task.tm_description = task.tm_description
-        new_task.tm_added_on = task.tm_added_on
-        new_task.erp_task_status = task.erp_task_status
-
-        new__db.session.add(new_task)
-        new__db.session.commit()
-
-    return Tasks.query.count()
-
-
-reset_new_db()
-print "populate_developers()"
-total_users = populate_developers()
-print "Total Users : " + str(total_users)
-print "populate_qa()"
-total_qas = populate_qa()
-print "Total Qas : " + str(total_qas)
-print "populate_milestones()"
-total_milestones = populate_milestones()
-print "Total Milestones : " + str(total_milestones)
-print "populate_projects()"
-total_projects = populate_projects()
-print "Total Projects : " + str(total_projects)
-print "populate_tasks()"
-total_tasks = populate_tasks()
-print "Total Tasks : " + str(total_tasks)
+def populate_tasks(chunk_size, hours_parser):
+    """
+    Populates tasks model, foreign keys missing in new database are set to NULL
+    :param hours_parser: DurationParser recording tasks whose estimated hours fell back to default
+    """
+    project_ids = set(project_id for project_id, in new__db.session.query(Projects.id))
+    milestone_ids = set(milestone_id for milestone_id, in new__db.session.query(Milestones.id))
+    qa_ids = set(qa_id for qa_id, in new__db.session.query(Qa.id))
+    developer_ids = set(user_id for user_id, in new__db.session.query(Users.id))
+
+    def convert(task):
+        return dict(id=task.id,
+                    tm_task_project_id=task.tm_task_project_id if task.tm_task_project_id in project_ids else None,
+                    tm_task_title=task.tm_task_title,
+                    tm_milestone=task.tm_milestone if task.tm_milestone in milestone_ids else None,
+                    tm_start_date=task.tm_start_date,
+                    tm_end_date=task.tm_end_date,
+                    tm_estimated_hours=hours_parser.parse(task.tm_estimated_hours, task.id),
+                    tm_qa=task.tm_qa if task.tm_qa in qa_ids else None,
+                    tm_developer=task.tm_developer if task.tm_developer in developer_ids else None,
+                    tm_priority=task.tm_priority,
+                    tm_type=task.tm_type,
+                    tm_description=task.tm_description,
+                    tm_added_on=task.tm_added_on,
+                    erp_task_status=task.erp_task_status)
+
+    query = _Tasks.query.filter(_Tasks.id > last_id(new__db.session, Tasks)).order_by(_Tasks.id.asc())
+    return migrate('Tasks', query, convert, new__db.session, Tasks.__table__, chunk_size)
+
+
+def report_fallbacks(hours_parser, path='estimated_hours_fallbacks.txt'):
+    """
+    Writes ids and values of tasks whose estimated hours were set to default
+    """
+    if not hours_parser.fallbacks:
+        return
+    with open(path, 'w') as report:
+        for task_id, value in hours_parser.fallbacks:
+            report.write('%s\t%r\n' % (task_id, value))
+    print "Estimated hours of %d tasks set to %s, listed in %s" % (len(hours_parser.fallbacks),
+                                                                   hours_parser.default, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migrates old database to new database')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows inserted per transaction')
+    parser.add_argument('--resume', action='store_true', help='Continue interrupted migration instead of starting over')
+    args = parser.parse_args()
+
+    if not args.resume:
+        reset_new_db()
+    populate_developers(args.chunk_size)
+    populate_qa(args.chunk_size)
+    populate_milestones(args.chunk_size)
+    populate_projects(args.chunk_size)
+    hours_parser = DurationParser()
+    populate_tasks(args.chunk_size, hours_parser)
+    print "Total Users : " + str(Users.query.count())
+    print "Total Qas : " + str(Qa.query.count())
+    print "Total Milestones : " + str(Milestones.query.count())
+    print "Total Projects : " + str(Projects.query.count())
+    print "Total Tasks : " + str(Tasks.query.count())
+    report_fallbacks(hours_parser)
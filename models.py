@@ -135,11 +135,67 @@ class Tasks(db.Model):
     tm_description = db.Column(db.String(), nullable=False)
     tm_added_on = db.Column(db.Date, nullable=False)
     erp_task_status = db.Column(db.Boolean, default=False)
+    tm_updated_on = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
     relative_project = relationship(Projects, backref=backref('tm_task_project_id'))
     relative_milestone = relationship(Milestones, backref=backref('tm_milestone'))
     relative_qa = relationship(Qa, foreign_keys=[tm_qa], backref=backref("tm_qa"))
     relative_developer = relationship(Users, foreign_keys=[tm_developer], backref=backref("tm_developer", uselist=True))
 
+    __table_args__ = (
+        db.Index('ix_tasks_tm_added_on', 'tm_added_on'),
+        db.Index('ix_tasks_developer_added_on', 'tm_developer', 'tm_added_on'),
+        db.Index('ix_tasks_developer_project', 'tm_developer', 'tm_task_project_id'),
+        db.Index('ix_tasks_erp_task_status', 'erp_task_status'),
+    )
+
     def __unicode__(self):
         return str(self.tm_task_project_id)
+
+
+class DailyTaskSummary(db.Model):
+    """
+    Tasks aggregated by day, developer and project, maintained by denormalize.refresh_daily_summary
+    """
+    __tablename__ = 'daily_task_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    tm_added_on = db.Column(db.Date, nullable=False)
+    tm_developer = db.Column(db.Integer, ForeignKey("users.id"))
+    tm_task_project_id = db.Column(db.Integer, ForeignKey("projects.id"))
+    tm_task_count = db.Column(db.Integer, nullable=False, default=0)
+    tm_estimated_seconds = db.Column(db.Integer, nullable=False, default=0)
+    tm_submitted_count = db.Column(db.Integer, nullable=False, default=0)
+
+    relative_developer = relationship(Users)
+    relative_project = relationship(Projects)
+
+    __table_args__ = (
+        db.Index('ix_daily_task_summary_key', 'tm_added_on', 'tm_developer', 'tm_task_project_id', unique=True),
+    )
+
+    def __unicode__(self):
+        return str(self.tm_added_on) + ': ' + str(self.tm_developer)
+
+
+class ErpJobs(db.Model):
+    """
+    Queue of tasks waiting to be added to ERP
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    tm_task_id = db.Column(db.Integer, ForeignKey("tasks.id"), nullable=False)
+    tm_job_status = db.Column(db.String(10), nullable=False, default="queued")
+    tm_attempts = db.Column(db.Integer, nullable=False, default=0)
+    tm_last_error = db.Column(db.String(), nullable=True)
+    tm_queued_on = db.Column(db.DateTime, default=datetime.now)
+    tm_updated_on = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    # jobs go along with their task, tm_task_id can not be NULL
+    relative_task = relationship(Tasks, backref=backref('tm_erp_jobs', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_erp_jobs_tm_job_status', 'tm_job_status'),
+        db.Index('ix_erp_jobs_tm_task_id', 'tm_task_id'),
+    )
+
+    def __unicode__(self):
+        return str(self.tm_task_id) + ': ' + self.tm_job_status
@@ -0,0 +1,66 @@
+# coding=utf-8
+"""
+Keyset (seek) pagination helpers, pages are fetched after the last row of previous page instead of using OFFSET
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(model, columns):
+    """
+    Returns URL safe token of model's values of key columns
+    :param model: last row of page
+    :param columns: names of key columns
+    """
+    values = []
+    for column in columns:
+        value = getattr(model, column)
+        if isinstance(value, date):
+            value = value.isoformat()
+        values.append(value)
+    return base64.urlsafe_b64encode(json.dumps(values))
+
+
+def decode_cursor(token, model_class, columns):
+    """
+    Returns values of key columns from token
+    :param token: token returned by encode_cursor
+    :param model_class: model of list view
+    :param columns: names of key columns
+    :return: list of values, None if token is invalid
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(str(token)))
+        if len(values) != len(columns):
+            return None
+        for i, column in enumerate(columns):
+            python_type = getattr(model_class, column).property.columns[0].type.python_type
+            if python_type is date:
+                values[i] = datetime.strptime(values[i], '%Y-%m-%d').date()
+        return values
+    except (TypeError, ValueError):
+        return None
+
+
+def seek_filter(model_class, columns, values):
+    """
+    Filter for rows coming after given key in descending order of key columns,
+    e.g. for (tm_added_on, id): tm_added_on < a OR (tm_added_on = a AND id < b)
+    :param model_class: model of list view
+    :param columns: names of key columns
+    :param values: values of key columns of last row
+    """
+    column = getattr(model_class, columns[0])
+    if len(columns) == 1:
+        return column < values[0]
+    return or_(column < values[0], and_(column == values[0], seek_filter(model_class, columns[1:], values[1:])))
+
+
+def add_cursor(url, token):
+    """
+    Adds cursor token to pager URL of Flask-Admin
+    """
+    return url + ('&' if '?' in url else '?') + 'cursor=' + token
@@ -0,0 +1,136 @@
+# coding=utf-8
+"""
+Profiles SQL of each request, query count, DB time and repeated statements (N+1 signatures)
+are sent in response headers to admins and kept for recent requests, slow queries are logged without parameters
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from auth import is_admin
+
+logger = logging.getLogger('task_manager.sql')
+
+_lock = threading.Lock()
+_requests = deque(maxlen=100)
+_statements = {}
+_config = {}
+
+# same statement run more often than this in one request is reported as duplicate
+DUPLICATE_THRESHOLD = 2
+# statements with IN lists of varying length are distinct, so totals are kept for a bounded number of them
+MAX_STATEMENTS = 1000
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.time() - conn.info['query_start_time'].pop()
+    threshold = _config.get('threshold')
+    if threshold is not None and elapsed >= threshold:
+        # parameters are left out, they may hold password hashes or other personal data
+        logger.warning('%.3fs %s %s', elapsed, request.path if has_request_context() else '-', statement)
+    if has_request_context() and 'sql_queries' in g:
+        g.sql_queries.append((statement, elapsed))
+
+
+class _SlowQueryHandler(logging.FileHandler):
+    """
+    Opens SQL_SLOW_QUERY_LOG of app when first slow query is logged, relative paths are under instance folder of app
+    """
+
+    def __init__(self, app):
+        self.app = app
+        logging.FileHandler.__init__(self, app.config['SQL_SLOW_QUERY_LOG'], delay=True)
+
+    def _open(self):
+        self.baseFilename = os.path.join(self.app.instance_path, self.app.config['SQL_SLOW_QUERY_LOG'])
+        directory = os.path.dirname(self.baseFilename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return logging.FileHandler._open(self)
+
+
+def init_app(app):
+    """
+    Hooks profiler to all SQLAlchemy engines and requests of app,
+    configured with SQL_PROFILING, SQL_SLOW_QUERY_THRESHOLD (seconds) and SQL_SLOW_QUERY_LOG
+    """
+    if not app.config.get('SQL_PROFILING'):
+        return
+    _config['threshold'] = app.config.get('SQL_SLOW_QUERY_THRESHOLD')
+    if app.config.get('SQL_SLOW_QUERY_LOG'):
+        handler = _SlowQueryHandler(app)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+
+def _start_request():
+    g.sql_queries = []
+
+
+def _finish_request(response):
+    queries = g.get('sql_queries')
+    if queries is None:
+        return response
+    counts = Counter(statement for statement, _ in queries)
+    duplicates = dict((statement, count) for statement, count in counts.items() if count > DUPLICATE_THRESHOLD)
+    total = sum(elapsed for _, elapsed in queries)
+
+    if is_admin():
+        response.headers['X-SQL-Queries'] = str(len(queries))
+        response.headers['X-SQL-Time'] = '%.1fms' % (total * 1000)
+        response.headers['X-SQL-Duplicates'] = str(sum(duplicates.values()))
+
+    endpoint = '%s %s' % (request.method, request.url_rule.rule if request.url_rule else request.path)
+    with _lock:
+        _requests.appendleft(dict(endpoint=endpoint, path=request.full_path, status=response.status_code,
+                                  count=len(queries), time=total, duplicates=duplicates, at=time.time()))
+        for statement, elapsed in queries:
+            if statement not in _statements and len(_statements) >= MAX_STATEMENTS:
+                continue
+            stats = _statements.setdefault(statement, dict(count=0, time=0.0, max=0.0))
+            stats['count'] += 1
+            stats['time'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+    return response
+
+
+def recent_requests():
+    """
+    Returns profiles of recent requests, latest first
+    """
+    with _lock:
+        return list(_requests)
+
+
+def top_statements(limit=20):
+    """
+    Returns (statement, stats) of statements having highest total time since start
+    """
+    with _lock:
+        statements = [(statement, dict(stats)) for statement, stats in _statements.items()]
+    return sorted(statements, key=lambda item: item[1]['time'], reverse=True)[:limit]
+
+
+def reset():
+    """
+    Drops collected profiles
+    """
+    with _lock:
+        _requests.clear()
+        _statements.clear()
@@ -0,0 +1,90 @@
+# coding=utf-8
+"""
+Streaming export of tasks as CSV or NDJSON, rows are fetched in chunks through a server-side cursor
+and written one by one, so memory stays flat whatever the number of tasks
+"""
+import json
+from datetime import date, time
+from io import BytesIO
+
+import unicodecsv
+
+from models import Milestones, Projects, Qa, Tasks, Users, db
+
+# (header, column) of exported fields
+FIELDS = (
+    ('Task_ID', Tasks.id),
+    ('Added_On', Tasks.tm_added_on),
+    ('Project_ID', Projects.erp_project_id),
+    ('Task_Title', Tasks.tm_task_title),
+    ('Milestone', Milestones.tm_milestone_name),
+    ('Start_Date', Tasks.tm_start_date),
+    ('End_Date', Tasks.tm_end_date),
+    ('Estimated_Hours', Tasks.tm_estimated_hours),
+    ('QA', Qa.erp_user_name),
+    ('Developer', Users.erp_user_name),
+    ('Priority', Tasks.tm_priority),
+    ('Type', Tasks.tm_type),
+    ('Description', Tasks.tm_description),
+    ('Submitted_In_ERP', Tasks.erp_task_status),
+)
+
+HEADERS = [header for header, _ in FIELDS]
+
+CHUNK_SIZE = 1000
+
+
+def task_rows(*criteria):
+    """
+    Yields tuples of FIELDS of tasks matching criteria in order of id, fetched CHUNK_SIZE at a time
+    :param criteria: filters on Tasks
+    """
+    query = db.session.query(*[column for _, column in FIELDS]).select_from(Tasks).outerjoin(
+        Projects, Tasks.tm_task_project_id == Projects.id).outerjoin(
+        Milestones, Tasks.tm_milestone == Milestones.id).outerjoin(
+        Qa, Tasks.tm_qa == Qa.id).outerjoin(
+        Users, Tasks.tm_developer == Users.id).filter(*criteria).order_by(Tasks.id.asc())
+    return query.execution_options(stream_results=True).yield_per(CHUNK_SIZE)
+
+
+def _format(value):
+    """
+    Dates as DD/MM/YYYY like XLS exports, times as HH:MM:SS, descriptions on one line
+    """
+    if isinstance(value, time):
+        return value.strftime('%H:%M:%S')
+    if isinstance(value, date):
+        return '{0.day:02d}/{0.month:02d}/{0.year:4d}'.format(value)
+    if isinstance(value, basestring):
+        return value.replace("\r\n", " ").strip()
+    return value
+
+
+def csv_lines(rows):
+    """
+    Yields CSV header and rows, encoded in UTF-8
+    """
+    buf = BytesIO()
+    writer = unicodecsv.writer(buf, encoding='utf-8')
+    writer.writerow(HEADERS)
+    yield buf.getvalue()
+    for row in rows:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow([_format(value) for value in row])
+        yield buf.getvalue()
+
+
+def ndjson_lines(rows):
+    """
+    Yields one JSON object per row
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(HEADERS, [_format(value) for value in row]))) + '\n'
+
+
+# format: (line generator, mimetype)
+FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
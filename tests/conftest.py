@@ -0,0 +1,110 @@
+# coding=utf-8
+"""
+Fixtures of Task Manager tests, app runs on a temporary SQLite database and statements sent to it are recorded
+"""
+import os
+import sys
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import count_cache  # noqa: E402
+import export_cache  # noqa: E402
+import main  # noqa: E402
+from models import Milestones, Projects, Qa, Tasks, Users, db  # noqa: E402
+
+TODAY = date.today()
+
+main.init_login()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def slow_query_log(tmpdir_factory):
+    """
+    Slow queries are logged to a temporary file instead of instance folder of the app
+    """
+    path = tmpdir_factory.mktemp('log').join('slow_queries.log')
+    main.app.config['SQL_SLOW_QUERY_LOG'] = str(path)
+    return path
+
+
+@pytest.fixture
+def app(tmpdir):
+    """
+    App on an empty database in tmpdir, caches of previous tests are dropped as ids start over
+    """
+    count_cache.invalidate()
+    export_cache.invalidate()
+    main.app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmpdir.join('tasks.db')))
+    with main.app.app_context():
+        db.create_all()
+        yield main.app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def statements():
+    """
+    List of SQL statements executed while test runs, recorded by a before_cursor_execute hook like sql_profiler's
+    """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(Engine, 'before_cursor_execute', record)
+
+
+def login(client, user):
+    """
+    Logs user in on client
+    """
+    with client.session_transaction() as session:
+        session['user_id'] = unicode(user.id)
+        session['_fresh'] = True
+
+
+def add_user(erp_id, role='developer', status=True):
+    user = Users(erp_user_id=erp_id, erp_user_name='User %d' % erp_id, tm_email_id='user%d@example.com' % erp_id,
+                 tm_password=generate_password_hash('password', method='sha256'), tm_user_role=role,
+                 tm_user_status=status)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def add_project(erp_id, developers=()):
+    """
+    Adds project with a milestone and a QA
+    :return: (project, milestone, qa)
+    """
+    project = Projects(erp_project_id=erp_id, tm_project_name='Project %d' % erp_id, tm_developer_id=list(developers))
+    qa = Qa(erp_user_id=erp_id, erp_user_name='QA %d' % erp_id, tm_email_id='qa%d@example.com' % erp_id)
+    milestone = Milestones(erp_milestone_id=erp_id, tm_milestone_name='Milestone %d' % erp_id,
+                           tm_milestone_project_id=erp_id)
+    db.session.add_all([project, qa, milestone])
+    db.session.commit()
+    return project, milestone, qa
+
+
+def add_task(developer, project, milestone, qa, day=TODAY, commit=True):
+    task = Tasks(tm_task_project_id=project.id, tm_task_title='Task', tm_milestone=milestone.id, tm_start_date=day,
+                 tm_end_date=day, tm_qa=qa.id, tm_developer=developer.id, tm_priority='high', tm_type='new',
+                 tm_description='Description', tm_added_on=day)
+    db.session.add(task)
+    if commit:
+        db.session.commit()
+    return task
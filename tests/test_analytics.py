@@ -0,0 +1,50 @@
+# coding=utf-8
+"""
+Tests of estimated hours analytics
+"""
+from datetime import timedelta
+
+import numpy as np
+
+import analytics
+from conftest import TODAY, add_project, add_task, add_user
+from denormalize import rebuild_daily_summary
+from models import DailyTaskSummary, db
+
+
+def _reference(start, end):
+    """
+    Arrays of load() built row by row
+    """
+    rows = sorted((summary.tm_developer, summary.tm_task_project_id or analytics.NO_PROJECT,
+                   summary.tm_added_on.toordinal(), summary.tm_estimated_seconds, summary.tm_task_count)
+                  for summary in DailyTaskSummary.query
+                  if start <= summary.tm_added_on <= end and summary.tm_developer is not None)
+    return [np.array(column, np.int64) for column in zip(*rows)]
+
+
+def test_load_matches_rows_of_daily_summary(app):
+    developers = [add_user(erp_id) for erp_id in range(100, 103)]
+    projects = [add_project(erp_id, developers) for erp_id in range(100, 102)]
+    for i in range(60):
+        task = add_task(developers[i % 3], *projects[i % 2], day=TODAY - timedelta(days=i % 10), commit=False)
+        if i % 7 == 0:
+            task.tm_task_project_id = None
+    db.session.commit()
+    rebuild_daily_summary()
+    db.session.commit()
+    start, end = TODAY - timedelta(days=7), TODAY
+
+    arrays = analytics.load(start, end)
+
+    assert all(array.dtype == np.int64 for array in arrays)
+    order = np.lexsort(arrays[::-1])
+    loaded = [array[order] for array in arrays]
+    assert [array.tolist() for array in loaded] == [array.tolist() for array in _reference(start, end)]
+    assert analytics.NO_PROJECT in arrays.project
+
+
+def test_load_of_days_without_tasks(app):
+    arrays = analytics.load(TODAY, TODAY)
+    assert [len(array) for array in arrays] == [0] * 5
+    assert analytics.report(TODAY, TODAY)['developers'] == []
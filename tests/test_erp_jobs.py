@@ -0,0 +1,66 @@
+# coding=utf-8
+"""
+Tests of ERP queue
+"""
+import pytest
+
+from conftest import add_project, add_task, add_user, login
+from erp_jobs import DONE, FAILED, QUEUED, TASK_DELETED, claim_jobs, enqueue_tasks, process_jobs
+from models import ErpJobs, Tasks, db
+
+
+class FakeClient(object):
+    """
+    ErpClient adding every task
+    """
+
+    def __init__(self):
+        self.added = []
+
+    def add_tasks(self, items):
+        self.added.extend(key for key, _, _ in items)
+        return dict((key, None) for key, _, _ in items)
+
+
+def _tasks(count):
+    developer = add_user(100)
+    project, milestone, qa = add_project(100, [developer])
+    return [add_task(developer, project, milestone, qa) for _ in range(count)]
+
+
+@pytest.mark.parametrize('status', [QUEUED, DONE])
+def test_task_can_be_deleted_after_approve(client, status):
+    login(client, add_user(1, role='admin'))
+    task_id = _tasks(1)[0].id
+    response = client.post('/all_tasks/action/', data=dict(action='approve', rowid=task_id))
+    assert response.status_code == 302
+    ErpJobs.query.update({'tm_job_status': status})
+    db.session.commit()
+
+    response = client.post('/all_tasks/delete/', data=dict(id=task_id, url='/all_tasks/'))
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert Tasks.query.count() == 0
+    assert ErpJobs.query.count() == 0
+
+
+@pytest.mark.parametrize('job_deleted', [False, True])
+def test_job_of_deleted_task_fails_alone(app, job_deleted):
+    kept, deleted = _tasks(2)
+    kept_id, deleted_id = kept.id, deleted.id
+    assert enqueue_tasks([kept_id, deleted_id]) == 2
+    jobs = claim_jobs(10)
+    deleted_job_id = [job.id for job in jobs if job.tm_task_id == deleted_id][0]
+
+    # task is deleted by another process while worker holds the claimed job
+    if job_deleted:
+        db.session.execute(ErpJobs.__table__.delete().where(ErpJobs.id == deleted_job_id))
+    db.session.execute(Tasks.__table__.delete().where(Tasks.id == deleted_id))
+    db.session.commit()
+
+    erp = FakeClient()
+    assert process_jobs(jobs, erp) == 1
+    assert len(erp.added) == 1
+    statuses = dict((job.tm_task_id, (job.tm_job_status, job.tm_last_error)) for job in ErpJobs.query)
+    assert statuses.pop(kept_id) == (DONE, None)
+    assert statuses == ({} if job_deleted else {deleted_id: (FAILED, TASK_DELETED)})
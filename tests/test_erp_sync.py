@@ -0,0 +1,51 @@
+# coding=utf-8
+"""
+Tests of ERP sync API
+"""
+import json
+
+from conftest import add_user, login
+from models import Projects, Users
+
+
+def _sync(client, *records):
+    response = client.post('/sync', data='\n'.join(json.dumps(record) for record in records))
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+def test_sync_keeps_role_of_existing_user_when_role_is_missing(client):
+    admin = add_user(1, role='admin')
+    login(client, admin)
+
+    result = _sync(client, dict(type='user', id=1, name='Lead', email='lead@example.com'),
+                   dict(type='user', id=2, name='New', email='new@example.com', password='secret'))
+
+    assert result['success'], result
+    roles = dict((user.erp_user_id, user.tm_user_role) for user in Users.query)
+    assert roles == {1: 'admin', 2: 'developer'}
+
+
+def test_sync_rejects_malformed_records_one_by_one(client):
+    login(client, add_user(1, role='admin'))
+    add_user(100)
+
+    result = _sync(client,
+                   dict(type='project', id=10, name='Bad developers', milestones=[dict(id=1, name='M')],
+                        developers=7),
+                   dict(type='project', id=11, name='Bad qas', milestones=[dict(id=2, name='M')], developers=[100],
+                        qas='x'),
+                   dict(type='project', id=12, name='Bad milestones', milestones=7, developers=[100]),
+                   dict(type='project', id=[13], name='Bad id', milestones=[dict(id=3, name='M')], developers=[100]),
+                   dict(type='user', id=2, name=['x'], email='x@example.com', password='secret'),
+                   dict(type='milestone', id=4, name='M', project={'id': 14}),
+                   dict(type=['user']),
+                   dict(type='project', id=15, name='Good', milestones=[dict(id=5, name='M')], developers=[100]))
+
+    assert not result['success']
+    assert result['counts'] == dict(project=dict(succeeded=1, failed=4), user=dict(succeeded=0, failed=1),
+                                    milestone=dict(succeeded=0, failed=1), qa=dict(succeeded=0, failed=0),
+                                    invalid=dict(succeeded=0, failed=1))
+    assert [project['message'] for project in result['results']['project']] == [
+        "Invalid developer id", "Invalid qa id", "Invalid milestone", "Invalid id or name", "Project Added"]
+    assert Projects.query.one().erp_project_id == 15
@@ -0,0 +1,209 @@
+# coding=utf-8
+"""
+Tests of Task Manager views
+"""
+import json
+import os
+import threading
+
+import pytest
+from sqlalchemy import Column, MetaData, Table
+
+import count_cache
+import dashboard
+import main
+import sql_profiler
+from conftest import TODAY, add_project, add_task, add_user, login
+from models import DailyTaskSummary, Tasks, Users, db
+
+
+def _dashboard_statements(client, statements):
+    del statements[:]
+    response = client.get('/admin/')
+    assert response.status_code == 200
+    return len(statements)
+
+
+def test_quick_view_query_count_does_not_grow_with_developers(client, statements):
+    admin = add_user(1, role='admin')
+    login(client, admin)
+    baseline = _dashboard_statements(client, statements)
+
+    for erp_id in range(100, 150):
+        developer = add_user(erp_id)
+        if erp_id % 2:
+            add_task(developer, *add_project(erp_id, [developer]))
+
+    assert _dashboard_statements(client, statements) == baseline == 3
+
+
+def test_parallel_exports_of_different_users(app, tmpdir):
+    developers = []
+    for erp_id in range(100, 108):
+        developer = add_user(erp_id)
+        project, milestone, qa = add_project(erp_id, [developer])
+        for _ in range(3):
+            add_task(developer, project, milestone, qa, commit=False)
+        developers.append((developer.id, developer.erp_user_name))
+    db.session.commit()
+
+    results = {}
+
+    def export(developer_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = unicode(developer_id)
+        responses = [client.get('/admin/action/all?date=' + TODAY.strftime('%d-%m-%Y')) for _ in range(3)]
+        results[developer_id] = [(response.status_code, response.headers.get('Content-Disposition'), response.data)
+                                 for response in responses]
+
+    cwd = os.getcwd()
+    tmpdir.chdir()
+    try:
+        threads = [threading.Thread(target=export, args=(developer_id,)) for developer_id, _ in developers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert os.getcwd() == str(tmpdir)
+        assert tmpdir.listdir() == [tmpdir.join('tasks.db')]
+    finally:
+        os.chdir(cwd)
+
+    for developer_id, name in developers:
+        assert len(results[developer_id]) == 3
+        for status, disposition, data in results[developer_id]:
+            assert status == 200
+            assert name.replace(' ', '_') in disposition
+            # each workbook holds tasks of its own developer only
+            assert [other for _, other in developers if other.encode('utf-8') in data] == [name]
+
+
+def _task_list_statements(client, statements, endpoint, page_size):
+    count_cache.invalidate()
+    del statements[:]
+    response = client.get('/%s/?page_size=%d' % (endpoint, page_size))
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('role, endpoint', [('admin', 'all_tasks'), ('developer', 'my_tasks')])
+def test_task_list_query_count_does_not_grow_with_page_size(client, statements, role, endpoint):
+    user = add_user(1, role=role)
+    developers = [user] if role == 'developer' else [add_user(erp_id) for erp_id in range(100, 200)]
+    projects = [add_project(erp_id, developers) for erp_id in range(100, 200)]
+    for i in range(500):
+        add_task(developers[i % len(developers)], *projects[i % len(projects)], commit=False)
+    db.session.commit()
+    login(client, user)
+
+    counts = [_task_list_statements(client, statements, endpoint, page_size) for page_size in (20, 100, 500)]
+    # logged in user, count and page with its related rows
+    assert counts == [3, 3, 3]
+
+
+def _user_lookups(statements):
+    """
+    Statements loading a user by primary key
+    """
+    return [statement for statement in statements
+            if statement.startswith('SELECT users.id AS users_id') and 'WHERE users.id = ?' in statement]
+
+
+@pytest.mark.parametrize('role, method, url', [
+    ('admin', 'get', '/admin/'),
+    ('admin', 'get', '/all_tasks/'),
+    ('admin', 'get', '/login_api'),
+    ('admin', 'post', '/update_project_api'),
+    ('developer', 'get', '/admin/'),
+    ('developer', 'get', '/today_tasks/'),
+    ('developer', 'get', '/my_tasks/'),
+    ('developer', 'get', '/login_api'),
+])
+def test_user_is_resolved_once_per_request(client, statements, role, method, url):
+    user = add_user(1, role=role)
+    developer = add_user(100) if role == 'admin' else user
+    add_task(developer, *add_project(100, [developer]))
+    login(client, user)
+    project = dict(id=100, name='Project 100', milestones=[dict(id=100, name='Milestone 100')], developers=[100])
+
+    del statements[:]
+    if method == 'post':
+        response = client.post(url, data=json.dumps(project), content_type='application/json')
+        assert json.loads(response.data)['success'], response.data
+    else:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert len(_user_lookups(statements)) == 1
+
+
+@pytest.mark.parametrize('role, shown', [(None, False), ('developer', False), ('admin', True)])
+def test_sql_headers_are_sent_to_admins_only(client, role, shown):
+    if role:
+        login(client, add_user(1, role=role))
+    response = client.get('/login_api')
+    assert ('X-SQL-Queries' in response.headers) == shown
+
+
+def test_slow_query_log_leaves_out_parameters(app, caplog, monkeypatch, slow_query_log):
+    monkeypatch.setitem(sql_profiler._config, 'threshold', 0)
+    Users.query.filter_by(tm_email_id='secret@example.com').first()
+    messages = [record.getMessage() for record in caplog.records if record.name == 'task_manager.sql']
+    assert messages and not any('secret@example.com' in message for message in messages)
+    assert 'FROM users' in slow_query_log.read()
+
+
+@pytest.mark.parametrize('url', ['/admin/action/all', '/admin/action/project'])
+def test_repeat_dashboard_download_is_served_from_cache(client, statements, url):
+    login(client, add_user(1, role='admin'))
+    for erp_id in range(100, 103):
+        developer = add_user(erp_id)
+        add_task(developer, *add_project(erp_id, [developer]))
+    url += '?date=' + TODAY.strftime('%d-%m-%Y')
+
+    first = client.get(url)
+    assert first.status_code == 200
+    del statements[:]
+    second = client.get(url)
+    assert second.data == first.data
+    # logged in user and watermark, tasks are not loaded again
+    assert len(statements) == 2
+
+    task = Tasks.query.first()
+    db.session.delete(task)
+    db.session.commit()
+    third = client.get(url)
+    assert third.status_code == 200 and third.data != first.data
+
+    # edit outside views, cached export is left as is
+    Tasks.query.update({'tm_task_title': 'Edited task'})
+    db.session.commit()
+    fourth = client.get(url)
+    assert fourth.status_code == 200 and fourth.data != third.data
+
+
+def test_upgrade_db_fills_created_daily_summary(client):
+    login(client, add_user(1, role='admin'))
+    present, absent = add_user(100), add_user(101)
+    add_task(present, *add_project(100, [present]))
+    # database of an older version or of migration scripts, without daily summary
+    DailyTaskSummary.__table__.drop(bind=db.engine)
+
+    assert main.upgrade_db() == [DailyTaskSummary.__tablename__]
+    assert dashboard.get_attendance(TODAY) == ([present], [absent])
+
+
+def test_upgrade_db_adds_missing_columns(app):
+    developer = add_user(100)
+    project, milestone, qa = add_project(100, [developer])
+    # tasks table of an older version, without tm_updated_on
+    Tasks.__table__.drop(bind=db.engine)
+    Table('tasks', MetaData(), *[Column(column.name, column.type, primary_key=column.primary_key)
+                                 for column in Tasks.__table__.columns if column.name != 'tm_updated_on']).create(
+        bind=db.engine)
+
+    created = main.upgrade_db()
+    assert created[0] == 'tasks.tm_updated_on'
+    assert sorted(created[1:]) == sorted(index.name for index in Tasks.__table__.indexes)
+    assert add_task(developer, project, milestone, qa).tm_updated_on is not None
+    assert main.upgrade_db() == []
@@ -0,0 +1,95 @@
+# coding=utf-8
+"""
+Tests of keyset pagination of task lists
+"""
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import count_cache
+from conftest import TODAY, add_project, add_task, add_user, login
+from models import Tasks, db
+from pagination import encode_cursor
+
+PAGE_SIZE = 20
+
+
+def _get(client, url):
+    """
+    Requests url, returns (statement, parameters) of SQL it ran
+    """
+    count_cache.invalidate()
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return executed
+
+
+def _page_query(executed):
+    """
+    Statement loading rows of page
+    """
+    pages = [(statement, parameters) for statement, parameters in executed
+             if statement.startswith('SELECT tasks.id') and 'LIMIT' in statement]
+    assert len(pages) == 1
+    return pages[0]
+
+
+def _plan(statement, parameters):
+    """
+    Details of SQLite query plan of statement
+    """
+    connection = db.session.connection().connection
+    return [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+@pytest.mark.parametrize('role, endpoint, columns, index', [
+    ('admin', 'all_tasks', ('id',), 'INTEGER PRIMARY KEY'),
+    ('developer', 'my_tasks', ('tm_added_on', 'id'), 'INDEX ix_tasks_developer_added_on'),
+])
+def test_deep_keyset_page_costs_same_as_first_page(client, role, endpoint, columns, index):
+    user = add_user(1, role=role)
+    developer = user if role == 'developer' else add_user(100)
+    project, milestone, qa = add_project(100, [developer])
+    for i in range(1000):
+        add_task(developer, project, milestone, qa, day=TODAY - timedelta(days=i // 10), commit=False)
+    db.session.commit()
+    login(client, user)
+    # last row of the page before the last one
+    last = Tasks.query.order_by(*[getattr(Tasks, column).asc() for column in columns]).offset(PAGE_SIZE).first()
+
+    first = _get(client, '/%s/?page_size=%d' % (endpoint, PAGE_SIZE))
+    deep = _get(client, '/%s/?page_size=%d&cursor=%s' % (endpoint, PAGE_SIZE, encode_cursor(last, columns)))
+
+    assert len(deep) == len(first)
+    statement, parameters = _page_query(deep)
+    # LIMIT ? OFFSET ?, rows are sought instead of skipped
+    assert list(parameters[-2:]) == [PAGE_SIZE, 0]
+    plan = _plan(statement, parameters)
+    tasks = [detail for detail in plan if ' tasks ' in detail + ' ']
+    assert tasks and all(detail.startswith('SEARCH') and index in detail for detail in tasks), plan
+    assert not any('TEMP B-TREE' in detail for detail in plan), plan
+
+
+@pytest.mark.parametrize('criterion, index', [
+    (Tasks.tm_added_on == TODAY, 'ix_tasks_tm_added_on'),
+    ((Tasks.tm_developer == 1) & (Tasks.tm_added_on == TODAY), 'ix_tasks_developer_added_on'),
+    ((Tasks.tm_developer == 1) & (Tasks.tm_task_project_id == 1), 'ix_tasks_developer_project'),
+    (Tasks.erp_task_status == True, 'ix_tasks_erp_task_status'),  # noqa: E712
+])
+def test_hot_task_filters_use_indexes(app, criterion, index):
+    compiled = Tasks.query.filter(criterion).statement.compile(dialect=db.engine.dialect)
+    parameters = [compiled.construct_params()[name] for name in compiled.positiontup]
+
+    plan = _plan(str(compiled), parameters)
+    assert any(detail.startswith('SEARCH') and index in detail for detail in plan), plan